@@ -0,0 +1,131 @@
+import re
+import time
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from os import getenv
+
+import metrics
+from config import DURATION_LIMIT, TG_AUDIO_FILESIZE_LIMIT, TG_VIDEO_FILESIZE_LIMIT
+
+# ------------------------------------
+# Pre-flight admission for play/download requests.
+#
+# Everything here works on metadata we already have (search results, the
+# metadata cache) so a request that would be refused anyway is refused
+# before any download or thumbnail render starts. Search results carry no
+# file size, so the size limits only apply when the caller passes one.
+# ------------------------------------
+
+METADATA_TTL = 6 * 60 * 60
+METADATA_CACHE_SIZE = int(getenv("METADATA_CACHE_SIZE", "10000"))
+metadata = OrderedDict()  # least recently used first
+stats = Counter()
+
+ALLOW = "allow"
+DOWNGRADE = "downgrade"  # video refused, audio is fine
+REJECT = "reject"
+
+_clock = re.compile(r"^\d+(:\d{1,2}){0,2}$")
+
+
+@lru_cache(maxsize=4096)
+def parse_duration(value):
+    # Search results give "3:45", "1:02:03", "Unknown Mins", "LIVE", None...
+    # Returns seconds, or None when the duration is unknown.
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = str(value).strip()
+    if _clock.match(text):
+        return sum(int(x) * 60**i for i, x in enumerate(reversed(text.split(":"))))
+    match = re.match(r"^(\d+)\s*(s|sec|secs|m|min|mins|h|hr|hrs)$", text.lower())
+    if match:
+        number, unit = int(match.group(1)), match.group(2)
+        if unit.startswith("h"):
+            return number * 3600
+        if unit.startswith("m"):
+            return number * 60
+        return number
+    return None
+
+
+def _entry(videoid):
+    entry = metadata.setdefault(videoid, {"time": time.time()})
+    metadata.move_to_end(videoid)
+    while len(metadata) > METADATA_CACHE_SIZE:
+        metadata.popitem(last=False)
+    return entry
+
+
+def remember(videoid, result):
+    # Store what a youtubesearchpython result tells us about a video.
+    duration = result.get("duration")
+    entry = _entry(videoid)
+    entry["duration"] = parse_duration(duration)
+    entry["time"] = time.time()
+    return entry
+
+
+def lookup(videoid):
+    entry = metadata.get(videoid)
+    if entry and time.time() - entry.get("time", 0) > METADATA_TTL:
+        metadata.pop(videoid, None)
+        return None
+    if entry:
+        metadata.move_to_end(videoid)
+    return entry
+
+
+def _verdict(action, reason=None):
+    stats[action] += 1
+    if action != ALLOW:
+        stats[f"{action}:{reason}"] += 1
+    return action, reason
+
+
+def check(videoid=None, duration=None, filesize=None, video=False):
+    # Returns (action, reason). `duration` overrides the cache when the
+    # caller already knows it.
+    entry = lookup(videoid) if videoid else None
+    if entry:
+        stats["cache_hit"] += 1
+    elif videoid:
+        stats["cache_miss"] += 1
+    entry = entry or {}
+
+    seconds = parse_duration(duration) if duration is not None else entry.get("duration")
+    if seconds is not None and seconds > DURATION_LIMIT:
+        return _verdict(REJECT, "duration")
+
+    if filesize is not None and not video and filesize > TG_AUDIO_FILESIZE_LIMIT:
+        return _verdict(REJECT, "audio_size")
+    if filesize is not None and video and filesize > TG_VIDEO_FILESIZE_LIMIT:
+        return _verdict(DOWNGRADE, "video_size")
+    return _verdict(ALLOW)
+
+
+def admitted(action):
+    return action != REJECT
+
+
+def report():
+    # Every reject/downgrade is a download (and thumbnail) we never started.
+    return {
+        "allowed": stats[ALLOW],
+        "rejected": stats[REJECT],
+        "downgraded": stats[DOWNGRADE],
+        "work_avoided": stats[REJECT] + stats[DOWNGRADE],
+        "cache_hits": stats["cache_hit"],
+        "cache_misses": stats["cache_miss"],
+        "reasons": {k: v for k, v in stats.items() if ":" in k},
+    }
+
+
+metrics.gauge("admission.allowed", lambda: stats[ALLOW])
+metrics.gauge("admission.rejected", lambda: stats[REJECT])
+metrics.gauge("admission.downgraded", lambda: stats[DOWNGRADE])
+metrics.gauge("admission.work_avoided", lambda: stats[REJECT] + stats[DOWNGRADE])
+metrics.gauge("admission.cache_hits", lambda: stats["cache_hit"])
+metrics.gauge("admission.cache_misses", lambda: stats["cache_miss"])
+metrics.gauge("admission.metadata", lambda: len(metadata))
@@ -0,0 +1,275 @@
+import asyncio
+import heapq
+import inspect
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from os import getenv
+
+import metrics
+from outbox import flood_wait_seconds
+
+# ------------------------------------
+# Auto-clean: delete the bot's own messages after a while, in bulk.
+#
+#   cleaner.use_mongo(db["autoclean"])    # survive restarts
+#   await cleaner.start(app)
+#   cleaner.track(await message.reply_text("..."))       # AUTOCLEAN_AFTER
+#   cleaner.add(chat_id, message_id, after=60)
+#
+# Message ids are kept per chat in a heap ordered by expiry. Every
+# AUTOCLEAN_INTERVAL seconds the sweeper takes each chat's expired ids and
+# deletes them with delete_messages, up to AUTOCLEAN_BATCH ids per call and
+# at most AUTOCLEAN_RATE calls/sec overall, so thousands of expired
+# messages cost a handful of requests instead of one each.
+#
+# New ids are written to Mongo once per sweep, and deleted ones are removed
+# the same way. start() reloads whatever was still pending.
+# ------------------------------------
+
+AUTOCLEAN_AFTER = float(getenv("AUTOCLEAN_AFTER", "600"))
+AUTOCLEAN_INTERVAL = float(getenv("AUTOCLEAN_INTERVAL", "5"))
+AUTOCLEAN_BATCH = int(getenv("AUTOCLEAN_BATCH", "100"))  # Telegram's limit per delete_messages
+AUTOCLEAN_RATE = float(getenv("AUTOCLEAN_RATE", "5"))  # delete_messages calls/sec, all chats
+# Telegram refuses to delete most messages older than 48h; give up on them.
+MAX_AGE = 47 * 60 * 60
+
+# Errors after which retrying the same ids is pointless.
+PERMANENT_ERRORS = (
+    "MessageDeleteForbidden",
+    "MessageIdInvalid",
+    "ChatAdminRequired",
+    "ChannelPrivate",
+    "ChannelInvalid",
+    "ChatWriteForbidden",
+    "PeerIdInvalid",
+    "UserIsBlocked",
+    "InputUserDeactivated",
+)
+
+
+def _epoch(value):
+    # pymongo hands back naive UTC datetimes.
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class AutoClean:
+    def __init__(self, collection=None, after=None, interval=None, batch=None, rate=None):
+        self.collection = collection
+        self.after = AUTOCLEAN_AFTER if after is None else after
+        self.interval = interval or AUTOCLEAN_INTERVAL
+        self.batch = min(batch or AUTOCLEAN_BATCH, 100)
+        self.rate = rate or AUTOCLEAN_RATE
+        self.client = None
+        self.chats = {}  # chat_id -> [(expires_at, message_id)] heap
+        self.paused = {}  # chat_id -> time a FloodWait ends
+        self.stats = Counter()
+        self._new = []  # not yet written to Mongo
+        self._done = []  # to remove from Mongo
+        self._next_call = 0.0
+        self._task = None
+
+    # ------------------------------------
+    # Recording
+    # ------------------------------------
+    def add(self, chat_id, message_id, after=None):
+        # Call from the event loop (handlers), not from executor threads.
+        expires_at = time.time() + (self.after if after is None else after)
+        heapq.heappush(self.chats.setdefault(chat_id, []), (expires_at, message_id))
+        if self.collection is not None:
+            self._new.append((chat_id, message_id, expires_at))
+        self.stats["added"] += 1
+
+    def track(self, message, after=None):
+        # Accepts what send_message / reply_text returned; returns it unchanged.
+        if message is not None:
+            self.add(message.chat.id, message.id, after)
+        return message
+
+    def pending(self, chat_id=None):
+        if chat_id is not None:
+            return len(self.chats.get(chat_id, ()))
+        return sum(len(heap) for heap in self.chats.values())
+
+    def due(self, now=None):
+        now = now or time.time()
+        return sum(1 for heap in self.chats.values() for expires_at, _ in heap if expires_at <= now)
+
+    def report(self):
+        now = time.time()
+        oldest = min((heap[0][0] for heap in self.chats.values() if heap), default=None)
+        return {
+            "pending": self.pending(),
+            "due": self.due(now),
+            "chats": len(self.chats),
+            "paused_chats": sum(1 for until in self.paused.values() if until > now),
+            "overdue_seconds": max(0.0, now - oldest) if oldest is not None else 0.0,
+            **self.stats,
+        }
+
+    # ------------------------------------
+    # Persistence
+    # ------------------------------------
+    def use_mongo(self, collection):
+        self.collection = collection
+        return self
+
+    async def _db(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def restore(self):
+        if self.collection is None:
+            return 0
+        docs = await self._db(lambda: list(self.collection.find({})))
+        cutoff = time.time() - MAX_AGE
+        stale = []
+        for doc in docs:
+            expires_at = _epoch(doc["expires_at"])
+            if expires_at < cutoff:
+                stale.append(doc["_id"])
+                continue
+            self.chats.setdefault(doc["chat_id"], []).append((expires_at, doc["message_id"]))
+        for heap in self.chats.values():
+            heapq.heapify(heap)
+        if stale:
+            await self._db(self.collection.delete_many, {"_id": {"$in": stale}})
+        self.stats["restored"] += len(docs) - len(stale)
+        return len(docs) - len(stale)
+
+    async def flush(self):
+        if self.collection is None:
+            return
+        new, self._new = self._new, []
+        done, self._done = self._done, []
+        if new:
+            docs = [
+                {"_id": f"{c}:{m}", "chat_id": c, "message_id": m, "expires_at": datetime.fromtimestamp(t, timezone.utc)}
+                for c, m, t in new
+            ]
+            try:
+                await self._db(lambda: self.collection.insert_many(docs, ordered=False))
+            except Exception as e:
+                # Duplicate ids (tracked twice) are fine; anything else is retried.
+                if type(e).__name__ != "BulkWriteError":
+                    self._new[:0] = new
+                    print(f"[autoclean] saving pending ids failed: {e}")
+        if done:
+            try:
+                await self._db(self.collection.delete_many, {"_id": {"$in": done}})
+            except Exception as e:
+                self._done[:0] = done
+                print(f"[autoclean] removing deleted ids failed: {e}")
+
+    # ------------------------------------
+    # Sweeping
+    # ------------------------------------
+    async def _throttle(self):
+        now = time.monotonic()
+        wait = self._next_call - now
+        self._next_call = max(now, self._next_call) + 1 / self.rate
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def _delete(self, chat_id, entries):
+        # entries: [(expires_at, message_id)]. Returns False if the chat got
+        # paused and the rest of its ids should wait.
+        ids = [message_id for _, message_id in entries]
+        await self._throttle()
+        try:
+            result = self.client.delete_messages(chat_id, ids)
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            seconds = flood_wait_seconds(e)
+            if seconds is not None or type(e).__name__ not in PERMANENT_ERRORS:
+                # FloodWait, network trouble etc: put them back and leave this
+                # chat alone for a while. MAX_AGE still bounds the retries.
+                self.stats["floods" if seconds is not None else "errors"] += 1
+                self.paused[chat_id] = time.time() + (seconds if seconds is not None else self.interval)
+                heap = self.chats.setdefault(chat_id, [])
+                for entry in entries:
+                    heapq.heappush(heap, entry)
+                return False
+            self.stats["failed"] += len(ids)
+        else:
+            self.stats["deleted"] += len(ids)
+            self.stats["batches"] += 1
+        if self.collection is not None:
+            self._done.extend(f"{chat_id}:{message_id}" for message_id in ids)
+        return True
+
+    async def sweep(self, now=None):
+        now = now or time.time()
+        cutoff = now - MAX_AGE
+        for chat_id in list(self.chats):
+            if self.paused.get(chat_id, 0) > now:
+                continue
+            self.paused.pop(chat_id, None)
+            heap = self.chats[chat_id]
+            while heap and heap[0][0] <= now:
+                entries = []
+                while heap and heap[0][0] <= now and len(entries) < self.batch:
+                    entry = heapq.heappop(heap)
+                    if entry[0] < cutoff:
+                        self.stats["expired"] += 1
+                        if self.collection is not None:
+                            self._done.append(f"{chat_id}:{entry[1]}")
+                        continue
+                    entries.append(entry)
+                if entries and not await self._delete(chat_id, entries):
+                    break
+            if not heap and self.chats.get(chat_id) is heap:
+                del self.chats[chat_id]
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sweep()
+                await self.flush()
+            except Exception as e:
+                print(f"[autoclean] sweep failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def start(self, client, restore=True):
+        self.client = client
+        if restore:
+            await self.restore()
+        metrics.gauge("autoclean.pending", self.pending)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+
+cleaner = AutoClean()
+
+
+def format_report(report):
+    return (
+        f"pending {report['pending']} in {report['chats']} chats, {report['due']} due now"
+        + (f" (oldest {report['overdue_seconds']:.0f}s overdue)" if report["due"] else "")
+        + f"\ndeleted {report.get('deleted', 0)} in {report.get('batches', 0)} calls, "
+        f"failed {report.get('failed', 0)}, expired {report.get('expired', 0)}, "
+        f"floodwaits {report.get('floods', 0)}, paused chats {report['paused_chats']}"
+    )
+
+
+def register_autoclean(app, autoclean=None):
+    from pyrogram import filters
+
+    from config import OWNER_ID
+
+    autoclean = autoclean or cleaner
+
+    @app.on_message(filters.command("autoclean") & filters.user(OWNER_ID), group=-1)
+    async def autoclean_command(client, message):
+        await message.reply_text(f"<code>{format_report(autoclean.report())}</code>")
+        message.stop_propagation()
+
+    return autoclean_command
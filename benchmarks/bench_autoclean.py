@@ -0,0 +1,24 @@
+from fixtures import run
+
+from autoclean import AutoClean
+from fakes import FakeClient
+
+client = FakeClient()
+
+
+def _filled(chats=50, per_chat=200):
+    cleaner = AutoClean(after=0, rate=1e9)
+    cleaner.client = client
+    for chat in range(chats):
+        for message_id in range(1, per_chat + 1):
+            cleaner.add(-1001000 - chat, message_id)
+    return cleaner
+
+
+def bench_track_10k():
+    _filled()
+
+
+def bench_sweep_10k():
+    # 10k expired messages in 50 chats -> 100 delete_messages calls.
+    run(_filled().sweep())
@@ -0,0 +1,23 @@
+import itertools
+
+from fixtures import group_message, load_bot, private_message, run
+
+bot = load_bot()
+_users = itertools.cycle(range(1000, 1500))
+
+
+def bench_private_greeting():
+    run(bot.handle_private_message(bot.client, private_message(bot, "hello, how are you?", next(_users))))
+
+
+def bench_private_completion():
+    run(bot.handle_private_message(bot.client, private_message(bot, "what is the capital of France?", next(_users))))
+
+
+def bench_group_mention():
+    message = group_message(bot, "@hinata_hyuga_bbot what is the tallest mountain?", next(_users))
+    run(bot.handle_group_message(bot.client, message))
+
+
+def bench_group_ignored():
+    run(bot.handle_group_message(bot.client, group_message(bot, "random chatter in the group", next(_users))))
@@ -0,0 +1,40 @@
+import io
+import itertools
+
+from fixtures import fixture_image, load_thumbnail_module
+
+thumb = load_thumbnail_module()
+
+from PIL import Image  # noqa: E402
+
+from nowplaying import NowPlaying, format_time, knob_position  # noqa: E402
+
+META = {"title": "Some Song Title", "duration": "3:45", "views": "1.2M views", "channel": "Some Channel"}
+youtube = Image.open(fixture_image())
+youtube.load()
+card = NowPlaying("bench", thumb.compose_base(youtube, META), META["duration"])
+_elapsed = itertools.count()
+
+
+def bench_full_render():
+    # What a refresh would cost without the dirty-rect path.
+    elapsed = next(_elapsed) % 225
+    background = thumb.compose_base(youtube, META)
+    thumb.draw_progress(background, format_time(elapsed), META["duration"], knob_position(elapsed, 225))
+
+
+def bench_incremental_render():
+    card.shown = None  # force a redraw every call
+    card.render(next(_elapsed) % 225)
+
+
+def bench_incremental_render_png():
+    card.shown = None
+    card.render(next(_elapsed) % 225)
+    card.card.save(io.BytesIO(), format="PNG")
+
+
+def bench_incremental_render_jpeg():
+    card.shown = None
+    card.render(next(_elapsed) % 225)
+    card.card.convert("RGB").save(io.BytesIO(), format="JPEG", quality=85)
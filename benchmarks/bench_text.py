@@ -0,0 +1,22 @@
+from fixtures import load_bot, load_functions
+
+from config import time_to_seconds
+
+bot = load_bot()
+hinglish = load_functions("gpt/gpt.py", {"is_hinglish"}, {})["is_hinglish"]
+
+
+def bench_time_to_seconds():
+    time_to_seconds("1:02:03")
+
+
+def bench_is_hinglish():
+    hinglish("bhai aaj kya plan hai, movie dekhne chalein kya?")
+
+
+def bench_casual_responses_hit():
+    bot.casual_responses("hello dosto, kaise ho", "Friend")
+
+
+def bench_casual_responses_miss():
+    bot.casual_responses("explain the theory of relativity in simple words", "Friend")
@@ -0,0 +1,34 @@
+import asyncio
+import itertools
+import os
+
+from fixtures import WORKDIR, fixture_image, load_thumbnail_module
+
+thumb = load_thumbnail_module()
+
+from PIL import Image  # noqa: E402
+
+source = Image.open(fixture_image(480, 360))
+source.load()
+_ids = itertools.count()
+_loop = asyncio.new_event_loop()
+
+
+def bench_change_image_size():
+    thumb.changeImageSize(1280, 720, source)
+
+
+def bench_clear_title():
+    thumb.clear("Some Really Long Song Title Official Music Video Featuring Several Artists And A Remix Tag")
+
+
+def bench_get_thumb_full_render():
+    # Fresh videoid each call so the cache/ shortcut never kicks in.
+    cwd = os.getcwd()
+    os.chdir(WORKDIR)
+    try:
+        videoid = f"bench{next(_ids)}"
+        path = _loop.run_until_complete(thumb.get_thumb(videoid))
+        os.remove(path)
+    finally:
+        os.chdir(cwd)
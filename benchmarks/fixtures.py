@@ -0,0 +1,148 @@
+import ast
+import asyncio
+import os
+import random
+import sys
+import tempfile
+from types import ModuleType, SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+os.environ.setdefault("API_ID", "0")
+
+from fakes import FakeClient, FakeMessage  # noqa: E402
+
+# ------------------------------------
+# Shared setup for the benchmarks: a scratch working directory, a fixture
+# thumbnail, and the gpt handlers loaded without their Telegram/Mongo/OpenAI
+# side effects.
+# ------------------------------------
+
+WORKDIR = tempfile.mkdtemp(prefix="bench_")
+os.makedirs(os.path.join(WORKDIR, "cache"), exist_ok=True)
+
+
+def fixture_image(width=1280, height=720):
+    # Deterministic stand-in for a YouTube maxres thumbnail.
+    path = os.path.join(WORKDIR, f"fixture_{width}x{height}.jpg")
+    if not os.path.exists(path):
+        from PIL import Image
+
+        rnd = random.Random(0)
+        image = Image.new("RGB", (width // 8, height // 8))
+        image.putdata([(rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)) for _ in range(image.width * image.height)])
+        image.resize((width, height)).save(path, quality=90)
+    return path
+
+
+def load_thumbnail_module():
+    # thumbnailchek lives inside the music bot; give it the two things it
+    # needs from the host package (app.name and its fonts).
+    if "AmritaXMusic" not in sys.modules:
+        host = ModuleType("AmritaXMusic")
+        host.app = SimpleNamespace(name="hinata")
+        sys.modules["AmritaXMusic"] = host
+
+    from PIL import ImageFont
+
+    truetype = ImageFont.truetype
+
+    def truetype_or_default(font=None, size=10, *args, **kwargs):
+        if isinstance(font, str) and not os.path.exists(font):
+            return ImageFont.load_default(size)
+        return truetype(font, size, *args, **kwargs)
+
+    ImageFont.truetype = truetype_or_default
+
+    import thumbnailchek
+
+    fixture = open(fixture_image(), "rb").read()
+
+    class FakeSearch:
+        def __init__(self, query, limit=1):
+            pass
+
+        async def next(self):
+            return {
+                "result": [
+                    {
+                        "title": "Some Song Title (Official Video) ft. Somebody",
+                        "duration": "3:45",
+                        "thumbnails": [{"url": "https://i.ytimg.com/vi/x/hqdefault.jpg?sqp=1"}],
+                        "viewCount": {"short": "1.2M views"},
+                        "channel": {"name": "Some Channel"},
+                    }
+                ]
+            }
+
+    class FakeResponse:
+        status = 200
+
+        async def read(self):
+            return fixture
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+    class FakeSession(FakeResponse):
+        def get(self, url):
+            return FakeResponse()
+
+    thumbnailchek.VideosSearch = FakeSearch
+    thumbnailchek.aiohttp = SimpleNamespace(ClientSession=FakeSession)
+    return thumbnailchek
+
+
+def load_functions(path, names, namespace):
+    # Pull plain function definitions out of a bot file without running its
+    # module-level setup (clients, API keys). Decorators are dropped.
+    tree = ast.parse(open(os.path.join(ROOT, path), encoding="utf-8").read())
+    wanted = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name in names:
+            node.decorator_list = []
+            wanted.append(node)
+    exec(compile(ast.Module(body=wanted, type_ignores=[]), path, "exec"), namespace)
+    return namespace
+
+
+def load_bot(path="gpt/testing.py", completion=None):
+    # The real bot module with in-memory Mongo and a stubbed completion.
+    from loadgen import load_bot as load
+
+    bot = load(path, completion or (lambda text, **kwargs: "stubbed completion"))
+    bot.limiter.rate = float("inf")  # benchmarks reuse a small set of users
+    bot.client = FakeClient()
+    outbox = getattr(bot, "outbox", None)
+    if outbox is not None:
+        # Deliver replies straight away; pacing isn't what's measured here.
+        outbox.client = bot.client
+        outbox.rate = float("inf")
+        outbox.private_interval = outbox.group_interval = 0
+        run(outbox.start())
+    return bot
+
+
+def run(coro):
+    # Handlers are coroutines now; benchmarks drive them on one shared loop.
+    # Pipeline handlers return the update's task; wait for that too.
+    result = _loop.run_until_complete(coro)
+    if isinstance(result, asyncio.Future):
+        result = _loop.run_until_complete(result)
+    return result
+
+
+_loop = asyncio.new_event_loop()
+
+
+def private_message(bot, text, user_id=100):
+    return FakeMessage(bot.client, text, user_id=user_id)
+
+
+def group_message(bot, text, user_id=100, chat_id=-100123):
+    return FakeMessage(bot.client, text, user_id=user_id, chat_id=chat_id, private=False, mentioned="@" in text)
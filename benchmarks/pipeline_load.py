@@ -0,0 +1,141 @@
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pyrogram.enums import ChatType  # noqa: E402
+
+from fixtures import group_message, load_bot, private_message, run  # noqa: E402
+
+# ------------------------------------
+# Throughput of the async handler pipeline with a stubbed completion client.
+#
+#   python benchmarks/pipeline_load.py --updates 2000 --latency 0.2
+#   python benchmarks/pipeline_load.py --baseline   # old one-thread-per-update model too
+#
+# All updates arrive at once and are dispatched by --workers workers, like
+# pyrogram's Client.workers, in both modes. Latency is measured from arrival
+# until the update is fully handled (for the pipeline, until the task the
+# handler returned finishes). The completion stub blocks for --latency
+# seconds like the real (sync) OpenAI client does.
+# ------------------------------------
+
+TEXTS = [
+    (True, "hello, how are you?"),
+    (True, "what is the capital of France?"),
+    (True, "explain how rainbows form"),
+    (False, "@hinata_hyuga_bbot what is the tallest mountain?"),
+    (False, "random chatter in the group"),
+]
+
+
+def stub_completion(latency):
+    def complete(text, **kwargs):
+        time.sleep(latency)
+        return "stubbed completion"
+
+    return complete
+
+
+def updates(bot, count, seed=0):
+    rnd = random.Random(seed)
+    users = itertools.cycle(range(1000, 1000 + max(count // 4, 1)))
+    for _ in range(count):
+        private, text = rnd.choice(TEXTS)
+        user = next(users)
+        yield private_message(bot, text, user) if private else group_message(bot, text, user)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def report(name, latencies, took, replies):
+    print(
+        f"{name:<10} {len(latencies) / took:8.1f} updates/s  "
+        f"p50 {statistics.median(latencies) * 1000:8.1f}ms  "
+        f"p99 {percentile(latencies, 0.99) * 1000:8.1f}ms  "
+        f"replies {replies}"
+    )
+
+
+async def run_pipeline(bot, messages, workers):
+    latencies = []
+    finishing = []
+    queue = asyncio.Queue()
+    for message in messages:
+        queue.put_nowait(message)
+
+    async def finish(task):
+        await task
+        latencies.append(time.perf_counter() - arrived)
+
+    async def worker():
+        while not queue.empty():
+            message = queue.get_nowait()
+            handler = bot.handle_private_message if message.chat.type is ChatType.PRIVATE else bot.handle_group_message
+            task = await handler(bot.client, message)
+            finishing.append(asyncio.get_running_loop().create_task(finish(task)))
+
+    arrived = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    await asyncio.gather(*finishing)
+    took = time.perf_counter() - arrived
+    while bot.outbox.depth() or bot.outbox.busy:
+        await asyncio.sleep(0.01)
+    return latencies, took
+
+
+def run_baseline(bot, messages, workers, latency):
+    # What the sync handlers did: the whole update, completion included,
+    # holds one of pyrogram's worker threads.
+    completion = stub_completion(latency)
+    arrived = time.perf_counter()
+
+    def handle(message):
+        private = message.chat.type is ChatType.PRIVATE
+        if private or "hinata_hyuga_bbot" in message.text or "assistant" in message.text.lower():
+            bot.save_user_data(message.from_user.id, message.from_user.first_name)
+            bot.detect(message.text)
+            if not (private and bot.casual_responses(message.text, message.from_user.first_name)):
+                completion(message.text)
+            bot.client.sent.append((message.chat.id, "reply", time.perf_counter()))
+        return time.perf_counter() - arrived
+
+    with ThreadPoolExecutor(workers) as pool:
+        latencies = list(pool.map(handle, messages))
+    return latencies, time.perf_counter() - arrived
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Async handler pipeline load benchmark")
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per stubbed completion")
+    parser.add_argument("--baseline", action="store_true", help="also run the old sync handler model")
+    parser.add_argument("--workers", type=int, default=min(32, (os.cpu_count() or 1) + 4), help="pyrogram dispatcher workers")
+    args = parser.parse_args()
+
+    bot = load_bot(completion=stub_completion(args.latency))
+    bot.detect("warm up langdetect profiles")
+    print(f"{args.updates} updates, completion latency {args.latency * 1000:.0f}ms, {args.workers} workers")
+
+    messages = list(updates(bot, args.updates))
+    latencies, took = run(run_pipeline(bot, messages, args.workers))
+    report("pipeline", latencies, took, len(bot.client.sent))
+
+    if args.baseline:
+        bot.client.sent.clear()
+        latencies, took = run_baseline(bot, list(updates(bot, args.updates)), args.workers, args.latency)
+        report("baseline", latencies, took, len(bot.client.sent))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import argparse
+import glob
+import importlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+# ------------------------------------
+# Micro-benchmark runner.
+#
+#   python benchmarks/run.py                       # run all, save JSON
+#   python benchmarks/run.py -k thumb              # only matching names
+#   python benchmarks/run.py --compare benchmarks/results/<old>.json
+#
+# Every bench_* function in benchmarks/bench_*.py is timed. Results are
+# written to benchmarks/results/<commit>.json so runs from different
+# commits can be compared; --compare exits non-zero on a regression.
+# ------------------------------------
+
+RESULTS_DIR = os.path.join(HERE, "results")
+
+
+def commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True)
+        return out.stdout.strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+
+def discover(pattern=None):
+    for path in sorted(glob.glob(os.path.join(HERE, "bench_*.py"))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        try:
+            module = importlib.import_module(name)
+        except ImportError as e:
+            print(f"skip {name}: {e}")
+            continue
+        for attr in sorted(dir(module)):
+            if attr.startswith("bench_") and callable(getattr(module, attr)):
+                full = f"{name[6:]}.{attr[6:]}"
+                if pattern and pattern not in full:
+                    continue
+                yield full, getattr(module, attr)
+
+
+def measure(func, min_time=0.2, repeat=5):
+    func()  # warm-up
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        took = time.perf_counter() - start
+        if took >= min_time / repeat or number >= 1 << 20:
+            break
+        number *= 2
+    samples = [took / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+    return {
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def human(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f}{unit}"
+    return f"{seconds / 1e-9:.0f}ns"
+
+
+def compare(results, old_path, threshold):
+    with open(old_path) as f:
+        old = json.load(f)
+    regressions = []
+    print(f"\ncompared with {old.get('commit')} (threshold x{threshold}):")
+    for name, stats in results.items():
+        before = old["results"].get(name)
+        if not before:
+            continue
+        ratio = stats["median"] / before["median"]
+        flag = "REGRESSION" if ratio > threshold else ""
+        print(f"  {name:40} {human(before['median']):>10} -> {human(stats['median']):>10}  x{ratio:.2f} {flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the hot-path micro-benchmarks")
+    parser.add_argument("-k", dest="pattern", help="only run benchmarks whose name contains this")
+    parser.add_argument("--min-time", type=float, default=0.2)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="JSON file to write (default benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="previous results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.2, help="median ratio counted as a regression")
+    args = parser.parse_args()
+
+    results = {}
+    for name, func in discover(args.pattern):
+        stats = measure(func, args.min_time, args.repeat)
+        results[name] = stats
+        print(f"{name:40} median {human(stats['median']):>10}  min {human(stats['min']):>10}  ({stats['number']}x{stats['repeat']})")
+
+    report = {
+        "commit": commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nsaved {output}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# ------------------------------------
+# Startup cost of the bot modules.
+#
+#   python benchmarks/startup.py config thumbnailchek
+#   python benchmarks/startup.py --top 30 gpt.testing
+#
+# Prints the slowest imports from `python -X importtime` and the wall time
+# of a fresh interpreter importing each module (the cost every restart and
+# every shard worker spawn pays).
+# ------------------------------------
+
+DEFAULT_MODULES = ["config", "thumbnailchek", "metrics", "shards"]
+
+
+def _env():
+    env = dict(os.environ)
+    env.setdefault("API_ID", "0")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, os.path.join(ROOT, "gpt"), env.get("PYTHONPATH")]))
+    return env
+
+
+def importtime(module):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        env=_env(),
+        capture_output=True,
+        text=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    return rows, proc.returncode, proc.stderr
+
+
+def wall_time(module, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", f"import {module}"], cwd=ROOT, env=_env(), capture_output=True)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time report and startup benchmark")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    baseline = statistics.median(wall_time("sys", args.repeat))
+    print(f"bare interpreter: {baseline * 1000:.1f}ms\n")
+    for module in args.modules:
+        rows, code, stderr = importtime(module)
+        if code:
+            print(f"== {module}: import failed\n{stderr.strip().splitlines()[-1]}\n")
+            continue
+        samples = wall_time(module, args.repeat)
+        median = statistics.median(samples)
+        print(f"== {module}: {median * 1000:.1f}ms wall ({(median - baseline) * 1000:.1f}ms over bare), {len(rows)} modules imported")
+        # Nested imports are indented; only show the ones the module pulls
+        # in directly so the cumulative column doesn't double count.
+        depth = min(len(name) - len(name.lstrip()) for _, _, name in rows)
+        direct = [r for r in rows if len(r[2]) - len(r[2].lstrip()) <= depth + 2]
+        for cumulative, own, name in sorted(direct, reverse=True)[: args.top]:
+            print(f"  {cumulative / 1000:8.1f}ms cumulative {own / 1000:8.1f}ms self  {name.strip()}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import asyncio
+import threading
+import time
+from collections import Counter, deque
+from os import getenv
+
+import metrics
+
+# ------------------------------------
+# Circuit breaker for a slow or flaky backend (the completion API).
+#
+#   breaker = CircuitBreaker("openai")
+#   answer = breaker.call(complete, query)   # raises BreakerOpen while tripped
+#
+# closed:    calls go through; their outcome and latency are kept for the
+#            last BREAKER_WINDOW seconds. Once there are BREAKER_MIN_CALLS,
+#            it trips if the error rate or the share of calls slower than
+#            BREAKER_SLOW_CALL seconds reaches its threshold.
+# open:      calls fail immediately with BreakerOpen.
+# half-open: after the cooldown one call is let through as a probe. Success
+#            closes the breaker; failure reopens it with a doubled cooldown.
+#
+# watch(probe) sends that probe from the background, so recovery doesn't
+# depend on (or cost) a user's request.
+# ------------------------------------
+
+BREAKER_WINDOW = float(getenv("BREAKER_WINDOW", "60"))
+BREAKER_MIN_CALLS = int(getenv("BREAKER_MIN_CALLS", "10"))
+BREAKER_ERROR_RATE = float(getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_SLOW_CALL = float(getenv("BREAKER_SLOW_CALL", "10"))
+BREAKER_SLOW_RATE = float(getenv("BREAKER_SLOW_RATE", "0.5"))
+BREAKER_COOLDOWN = float(getenv("BREAKER_COOLDOWN", "30"))
+BREAKER_MAX_COOLDOWN = float(getenv("BREAKER_MAX_COOLDOWN", "600"))
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half-open", "open"
+_STATE_VALUE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class BreakerOpen(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name,
+        window=None,
+        min_calls=None,
+        error_rate=None,
+        slow_call=None,
+        slow_rate=None,
+        cooldown=None,
+        max_cooldown=None,
+        clock=time.monotonic,
+    ):
+        self.name = name
+        self.window = window or BREAKER_WINDOW
+        self.min_calls = min_calls or BREAKER_MIN_CALLS
+        self.error_rate = error_rate or BREAKER_ERROR_RATE
+        self.slow_call = slow_call or BREAKER_SLOW_CALL
+        self.slow_rate = slow_rate or BREAKER_SLOW_RATE
+        self.cooldown = cooldown or BREAKER_COOLDOWN
+        self.max_cooldown = max_cooldown or BREAKER_MAX_COOLDOWN
+        self.clock = clock
+
+        self.state = CLOSED
+        self.reason = None
+        self.opened_at = None
+        self.current_cooldown = self.cooldown
+        self.forced = False
+        self.probing = False
+        self.calls = deque()  # (finished_at, seconds, ok)
+        self._errors = 0
+        self._slow = 0
+        self.stats = Counter()
+        # Calls finish on executor threads.
+        self._lock = threading.Lock()
+
+        metrics.gauge(f"breaker.{name}.state", lambda: _STATE_VALUE[self.state])
+        metrics.gauge(f"breaker.{name}.rejected", lambda: self.stats["rejected"])
+
+    # -- bookkeeping (caller holds the lock) --
+
+    def _forget(self):
+        self.calls.clear()
+        self._errors = self._slow = 0
+
+    def _prune(self, now):
+        while self.calls and now - self.calls[0][0] > self.window:
+            _, seconds, ok = self.calls.popleft()
+            self._errors -= not ok
+            self._slow -= seconds >= self.slow_call
+
+    def _trip_reason(self):
+        total = len(self.calls)
+        if total < self.min_calls:
+            return None
+        if self._errors / total >= self.error_rate:
+            return f"{self._errors}/{total} calls failed"
+        if self._slow / total >= self.slow_rate:
+            return f"{self._slow}/{total} calls slower than {self.slow_call:g}s"
+        return None
+
+    def _open(self, now, reason, backoff=False):
+        if backoff:
+            self.current_cooldown = min(self.current_cooldown * 2, self.max_cooldown)
+        else:
+            self.current_cooldown = self.cooldown
+            self.stats["trips"] += 1
+        self.state = OPEN
+        self.reason = reason
+        self.opened_at = now
+        self._forget()
+
+    def _close(self):
+        self.state = CLOSED
+        self.reason = None
+        self.opened_at = None
+        self.current_cooldown = self.cooldown
+        self._forget()
+
+    # -- public --
+
+    def retry_in(self):
+        if self.state != OPEN or self.forced:
+            return 0.0
+        return max(0.0, self.opened_at + self.current_cooldown - self.clock())
+
+    def _admit(self):
+        # Returns True if this call is the half-open probe.
+        with self._lock:
+            if self.state == CLOSED:
+                return False
+            if self.state == OPEN and not self.forced and self.clock() - self.opened_at >= self.current_cooldown:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self.probing:
+                self.probing = True
+                self.stats["probes"] += 1
+                return True
+            self.stats["rejected"] += 1
+        raise BreakerOpen(f"{self.name} unavailable: {self.reason}")
+
+    def _record(self, seconds, ok, probe):
+        with self._lock:
+            now = self.clock()
+            if probe:
+                self.probing = False
+                if ok and seconds < self.slow_call:
+                    self._close()
+                    self.stats["recoveries"] += 1
+                else:
+                    self._open(now, f"probe {'too slow' if ok else 'failed'}", backoff=True)
+                return
+            self.stats["calls"] += 1
+            self.stats["errors"] += not ok
+            if self.state != CLOSED:
+                return  # started before the trip
+            self.calls.append((now, seconds, ok))
+            self._errors += not ok
+            self._slow += seconds >= self.slow_call
+            self._prune(now)
+            reason = self._trip_reason()
+            if reason:
+                self._open(now, reason)
+
+    def call(self, func, *args, **kwargs):
+        probe = self._admit()
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self._record(time.perf_counter() - start, False, probe)
+            raise
+        self._record(time.perf_counter() - start, True, probe)
+        return result
+
+    def force_open(self, reason="opened by owner"):
+        with self._lock:
+            self._open(self.clock(), reason)
+            self.forced = True
+
+    def reset(self):
+        with self._lock:
+            self.forced = False
+            self.probing = False
+            self._close()
+
+    async def watch(self, probe, interval=5):
+        # probe: blocking callable that raises when the backend is unhealthy.
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            if self.state != OPEN or self.forced or self.retry_in() > 0:
+                continue
+            try:
+                await loop.run_in_executor(None, self.call, probe)
+            except Exception:
+                pass
+
+    def report(self):
+        with self._lock:
+            self._prune(self.clock())
+            latencies = sorted(seconds for _, seconds, _ in self.calls)
+            total = len(latencies)
+
+        def at(q):
+            return latencies[min(total - 1, int(q * total))] if total else 0.0
+
+        return {
+            "state": self.state + (" (forced)" if self.forced else ""),
+            "reason": self.reason,
+            "retry_in": self.retry_in(),
+            "window_calls": total,
+            "error_rate": self._errors / total if total else 0.0,
+            "slow_rate": self._slow / total if total else 0.0,
+            "p50": at(0.5),
+            "p90": at(0.9),
+            **self.stats,
+        }
+
+
+def format_report(breaker):
+    r = breaker.report()
+    lines = [f"{breaker.name}: {r['state']}"]
+    if r["reason"]:
+        lines.append(f"reason: {r['reason']}")
+    if r["retry_in"]:
+        lines.append(f"next probe in {r['retry_in']:.0f}s")
+    lines += [
+        f"last {breaker.window:g}s: {r['window_calls']} calls, {r['error_rate']:.0%} errors, "
+        f"{r['slow_rate']:.0%} slow, p50 {r['p50']:.2f}s, p90 {r['p90']:.2f}s",
+        f"trips {r.get('trips', 0)}, rejected {r.get('rejected', 0)}, "
+        f"probes {r.get('probes', 0)}, recoveries {r.get('recoveries', 0)}",
+    ]
+    return "\n".join(lines)
+
+
+def register_breaker(app, *breakers):
+    from pyrogram import filters
+
+    from config import OWNER_ID
+
+    # /breaker shows the state, /breaker open forces degraded mode,
+    # /breaker reset closes it again.
+    @app.on_message(filters.command("breaker") & filters.user(OWNER_ID), group=-1)
+    async def breaker_command(client, message):
+        action = message.command[1].lower() if len(message.command) > 1 else None
+        for breaker in breakers:
+            if action == "open":
+                breaker.force_open()
+            elif action == "reset":
+                breaker.reset()
+        await message.reply_text("\n\n".join(f"<code>{format_report(b)}</code>" for b in breakers))
+        message.stop_propagation()
+
+    return breaker_command
@@ -0,0 +1,250 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from os import getenv
+
+from outbox import flood_wait_seconds
+
+# ------------------------------------
+# Resumable broadcast to every stored user.
+#
+# User ids are read from Mongo in _id order, one batch at a time, and sent
+# with bounded concurrency under a global rate limit. The _id up to which
+# every send has finished is saved at most BROADCAST_CHECKPOINT_INTERVAL
+# seconds apart, so a crashed or stopped broadcast resumes where it left
+# off. A crash re-sends at most the sends in flight plus the ones since the
+# last save: about BROADCAST_CONCURRENCY + BROADCAST_RATE *
+# BROADCAST_CHECKPOINT_INTERVAL users (45 with the defaults). Users who
+# blocked the bot or deleted their account are removed on the way.
+# ------------------------------------
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_RATE = float(getenv("BROADCAST_RATE", "25"))  # messages/sec
+BROADCAST_CONCURRENCY = int(getenv("BROADCAST_CONCURRENCY", "20"))
+BROADCAST_BATCH = int(getenv("BROADCAST_BATCH", "500"))
+BROADCAST_CHECKPOINT_INTERVAL = float(getenv("BROADCAST_CHECKPOINT_INTERVAL", "1"))
+
+# Errors meaning the user is gone for good. PeerIdInvalid is not one of
+# them: it also fires for live users whose access hash this session hasn't
+# cached yet, so it only counts as a failure.
+DEAD_USER_ERRORS = (
+    "UserIsBlocked",
+    "InputUserDeactivated",
+    "UserDeactivated",
+    "UserDeactivatedBan",
+)
+
+
+async def _db(func, *args, **kwargs):
+    # pymongo is blocking; keep it off the event loop.
+    return await asyncio.get_running_loop().run_in_executor(None, lambda: func(*args, **kwargs))
+
+
+class Broadcast:
+    def __init__(
+        self, client, users, checkpoints, broadcast_id, send, rate=None, concurrency=None, batch=None, checkpoint_interval=None
+    ):
+        # send(client, user_id) is awaited for every user.
+        self.client = client
+        self.users = users
+        self.checkpoints = checkpoints
+        self.id = broadcast_id
+        self.send = send
+        self.rate = rate or BROADCAST_RATE
+        self.concurrency = concurrency or BROADCAST_CONCURRENCY
+        self.batch = batch or BROADCAST_BATCH
+        self.checkpoint_interval = BROADCAST_CHECKPOINT_INTERVAL if checkpoint_interval is None else checkpoint_interval
+        self.state = {"last_id": None, "sent": 0, "failed": 0, "pruned": 0, "done": False}
+        self.started = None
+        self.stopped = False
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+        self._order = deque()  # _ids of the current batch not yet passed by last_id
+        self._finished = set()
+        self._saved_at = 0.0
+        self._saving = False
+
+    def _load(self):
+        doc = self.checkpoints.find_one({"_id": self.id})
+        if doc:
+            self.state.update({k: doc[k] for k in self.state if k in doc})
+
+    def _save(self, state):
+        self.checkpoints.update_one({"_id": self.id}, {"$set": state}, upsert=True)
+
+    async def _checkpoint(self, force=False):
+        # One save in flight at a time; the state is copied on the loop.
+        now = time.monotonic()
+        if self._saving or (not force and now - self._saved_at < self.checkpoint_interval):
+            return
+        self._saving = True
+        try:
+            await _db(self._save, dict(self.state))
+        finally:
+            self._saving = False
+            self._saved_at = now
+
+    async def _finish(self, doc):
+        # last_id only moves past users whose send is over, so a resume
+        # never skips anyone.
+        self._finished.add(doc["_id"])
+        while self._order and self._order[0] in self._finished:
+            self._finished.discard(self._order[0])
+            self.state["last_id"] = self._order.popleft()
+        await self._checkpoint()
+
+    def _fetch(self):
+        query = {"_id": {"$gt": self.state["last_id"]}} if self.state["last_id"] is not None else {}
+        return list(self.users.find(query, {"user_id": 1}).sort("_id", 1).limit(self.batch))
+
+    async def _throttle(self):
+        # Hands out evenly spaced send slots; a FloodWait pushes every
+        # pending slot back since Telegram applies it to the whole bot.
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self._next_slot, self._paused_until)
+        self._next_slot = slot + 1 / self.rate
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def _send_one(self, doc, semaphore):
+        async with semaphore:
+            await self._deliver(doc)
+        # Skipped if cancelled mid-send, so last_id never passes an unsent user.
+        await self._finish(doc)
+
+    async def _deliver(self, doc):
+        for _ in range(3):
+            await self._throttle()
+            try:
+                await self.send(self.client, doc["user_id"])
+                self.state["sent"] += 1
+                return
+            except Exception as e:
+                wait = flood_wait_seconds(e)
+                if wait is not None:
+                    self._paused_until = asyncio.get_running_loop().time() + wait
+                    continue
+                if type(e).__name__ in DEAD_USER_ERRORS:
+                    await _db(self.users.delete_one, {"_id": doc["_id"]})
+                    self.state["pruned"] += 1
+                else:
+                    self.state["failed"] += 1
+                return
+        self.state["failed"] += 1
+
+    def progress(self):
+        took = time.monotonic() - self.started if self.started else 0
+        done = self.state["sent"] + self.state["failed"] + self.state["pruned"]
+        return {
+            **self.state,
+            "elapsed": took,
+            "rate": done / took if took else 0.0,
+        }
+
+    async def run(self, on_progress=None, every=5):
+        await _db(self._load)
+        if self.state["done"]:
+            return self.progress()
+        self.started = time.monotonic()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        last_report = 0.0
+        while not self.stopped:
+            docs = await _db(self._fetch)
+            if not docs:
+                self.state["done"] = True
+                break
+            self._order.extend(doc["_id"] for doc in docs)
+            await asyncio.gather(*(self._send_one(doc, semaphore) for doc in docs))
+            if on_progress and time.monotonic() - last_report >= every:
+                last_report = time.monotonic()
+                await on_progress(self.progress())
+        await _db(self._save, dict(self.state))
+        return self.progress()
+
+    def stop(self):
+        self.stopped = True
+
+
+def format_progress(p):
+    status = "done" if p["done"] else "running"
+    return (
+        f"Broadcast {status}\n"
+        f"sent: {p['sent']} | failed: {p['failed']} | pruned: {p['pruned']}\n"
+        f"{p['rate']:.1f} msg/s, {p['elapsed']:.0f}s elapsed"
+    )
+
+
+running = {}
+
+
+def register_broadcast(app, users, checkpoints):
+    from pyrogram import filters
+
+    from config import OWNER_ID
+
+    # /broadcast (as a reply) starts a new broadcast of the replied message,
+    # /broadcast resume continues the last unfinished one, /broadcast stop halts it.
+    @app.on_message(filters.command("broadcast") & filters.user(OWNER_ID), group=-1)
+    async def broadcast_command(client, message):
+        try:
+            await _broadcast_command(client, message)
+        except Exception:
+            # Logged here: stop_propagation() raises and would hide it.
+            logger.exception("/broadcast failed")
+        message.stop_propagation()
+
+    async def _broadcast_command(client, message):
+        arg = message.command[1].lower() if len(message.command) > 1 else None
+
+        if arg == "stop":
+            for job in running.values():
+                job.stop()
+            return await message.reply_text("Stopping after the current batch.")
+        if running:
+            return await message.reply_text("A broadcast is already running.")
+
+        if arg == "resume":
+            # _id is "chat:message", which doesn't sort by age.
+            doc = await _db(checkpoints.find_one, {"done": False}, sort=[("started_at", -1)])
+            if not doc:
+                return await message.reply_text("Nothing to resume.")
+            broadcast_id, chat_id, message_id = doc["_id"], doc["from_chat"], doc["message_id"]
+        elif message.reply_to_message:
+            chat_id, message_id = message.chat.id, message.reply_to_message.id
+            broadcast_id = f"{chat_id}:{message_id}"
+            await _db(
+                checkpoints.update_one,
+                {"_id": broadcast_id},
+                {"$set": {"from_chat": chat_id, "message_id": message_id, "done": False, "started_at": time.time()}},
+                upsert=True,
+            )
+        else:
+            return await message.reply_text("Reply to a message with /broadcast, or use /broadcast resume.")
+
+        async def send(client, user_id):
+            await client.copy_message(user_id, chat_id, message_id)
+
+        job = Broadcast(client, users, checkpoints, broadcast_id, send)
+        running[broadcast_id] = job
+        status = await message.reply_text("Broadcast started...")
+
+        async def on_progress(p):
+            try:
+                await status.edit_text(format_progress(p))
+            except Exception:
+                pass
+
+        async def run():
+            try:
+                result = await job.run(on_progress)
+            finally:
+                running.pop(broadcast_id, None)
+            await status.edit_text(format_progress(result))
+
+        # Runs in the background so the dispatcher isn't held for hours.
+        asyncio.get_running_loop().create_task(run())
+
+    return broadcast_command
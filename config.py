@@ -2,11 +2,13 @@ import re
 from os import getenv
 # ------------------------------------
 # ------------------------------------
-from dotenv import load_dotenv
-from pyrogram import filters
-# ------------------------------------
-# ------------------------------------
-load_dotenv()
+# find_dotenv() walks up the parent directories like load_dotenv() always
+# has; the file is only read when one turns up.
+from dotenv import find_dotenv, load_dotenv
+
+_dotenv_path = find_dotenv()
+if _dotenv_path:
+    load_dotenv(_dotenv_path)
 # ------------------------------------
 # -----------------------------------------------------
 API_ID = int(getenv("API_ID"))
@@ -29,7 +31,13 @@ ASSUSERNAME = getenv("ASSUSERNAME" , "Hinatahyuga")
 #---------------------------------------------------------------
 #---------------------------------------------------------------
 MONGO_DB_URI = getenv("MONGO_DB_URI", None)
+MONGODB_CONNECTION_STRING = getenv("MONGODB_CONNECTION_STRING", MONGO_DB_URI)
+#---------------------------------------------------------------
 #---------------------------------------------------------------
+OPENAI_API_KEY = getenv("OPENAI_API_KEY", None)
+ENABLE_CHATGPT = getenv("ENABLE_CHATGPT", "true").lower() == "true"
+ADMIN_USER_IDS = list(map(int, getenv("ADMIN_USER_IDS", "").split()))
+AUTOCLEAN_GROUPS = getenv("AUTOCLEAN_GROUPS", "false").lower() == "true"
 #---------------------------------------------------------------
 
 # ----------------------------------------------------------------
@@ -126,7 +134,7 @@ STRING4 = getenv("STRING_SESSION4", None)
 STRING5 = getenv("STRING_SESSION5", None)
 STRING6 = getenv("STRING_SESSION6", None)
 STRING7 = getenv("STRING_SESSION7", None)
-BANNED_USERS = filters.user()
+STRING_SESSION = STRING1
 adminlist = {}
 lyrical = {}
 votemode = {}
@@ -166,6 +174,17 @@ SPOTIFY_PLAYLIST_IMG_URL = "https://telegra.ph/file/6c741a6bc1e1663ac96fc.jpg"
 # ------------------------------------------------------------------------
 # ------------------------------------------------------------------------
 # ------------------------------------------------------------------------
+def __getattr__(name):
+    # BANNED_USERS needs pyrogram; build it the first time someone asks for it.
+    if name == "BANNED_USERS":
+        from pyrogram import filters
+
+        global BANNED_USERS
+        BANNED_USERS = filters.user()
+        return BANNED_USERS
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 def time_to_seconds(time):
     stringt = str(time)
     return sum(int(x) * 60**i for i, x in enumerate(reversed(stringt.split(":"))))
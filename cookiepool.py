@@ -0,0 +1,189 @@
+import os
+import tempfile
+import threading
+import time
+from itertools import count
+from os import getenv
+
+# ------------------------------------
+# Rotating pool of YouTube cookie jars.
+#
+# cookies.txt holds several Netscape jars pasted one after another. They are
+# parsed once, ordered by the earliest expiry of their session cookies and
+# handed out round-robin, so requests are spread over accounts and a jar
+# that starts failing is parked for a while instead of being retried.
+#
+#   jar = pool.acquire()                  # None when every jar is parked
+#   headers["Cookie"] = jar.header        # or {"cookiefile": jar.cookiefile()} for yt-dlp
+#   pool.success(jar) / pool.failure(jar)
+# ------------------------------------
+
+COOKIES_FILE = getenv("COOKIES_FILE", "cookies.txt")
+COOKIE_QUARANTINE_TIME = int(getenv("COOKIE_QUARANTINE_TIME", "900"))
+COOKIE_MAX_FAILURES = int(getenv("COOKIE_MAX_FAILURES", "3"))
+# Jars expiring within this many seconds are treated as already stale.
+COOKIE_EXPIRY_MARGIN = int(getenv("COOKIE_EXPIRY_MARGIN", "300"))
+
+HEADER = "# Netscape HTTP Cookie File"
+# Browsers write HttpOnly cookies (usually the auth ones) as commented-out
+# lines with this prefix.
+HTTPONLY_PREFIX = "#HttpOnly_"
+# The cookies that decide whether a jar is still logged in.
+SESSION_COOKIES = (
+    "SID",
+    "HSID",
+    "SSID",
+    "APISID",
+    "SAPISID",
+    "SIDCC",
+    "__Secure-1PSID",
+    "__Secure-3PSID",
+    "__Secure-1PSIDTS",
+    "__Secure-3PSIDTS",
+    "__Secure-1PSIDCC",
+    "__Secure-3PSIDCC",
+)
+
+
+class CookieJar:
+    _ids = count()
+
+    def __init__(self, lines):
+        self.id = next(self._ids)
+        self.lines = []  # only the well-formed ones; cookiefile() writes these out
+        self.cookies = {}
+        expiries = []
+        for line in lines:
+            parts = line.split()
+            if len(parts) < 7:
+                continue
+            try:
+                expiry = int(parts[4])
+            except ValueError:
+                continue
+            name, value = parts[5], " ".join(parts[6:])
+            self.lines.append(line)
+            self.cookies[name] = value
+            # expiry 0 means a browser-session cookie; it doesn't age out.
+            if name in SESSION_COOKIES and expiry:
+                expiries.append(expiry)
+        self.expires = min(expiries) if expiries else 0
+        self.header = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+        self.failures = 0
+        self.quarantined_until = 0
+        self.uses = 0
+        self._file = None
+
+    def usable(self, now):
+        if now < self.quarantined_until:
+            return False
+        return not self.expires or self.expires - COOKIE_EXPIRY_MARGIN > now
+
+    def cookiefile(self):
+        # yt-dlp wants a path; write each jar out once and reuse it.
+        if self._file is None or not os.path.exists(self._file):
+            fd, path = tempfile.mkstemp(prefix=f"cookies{self.id}_", suffix=".txt")
+            with os.fdopen(fd, "w") as f:
+                f.write(HEADER + "\n\n")
+                f.write("\n".join("\t".join(line.split()) for line in self.lines))
+                f.write("\n")
+            self._file = path
+        return self._file
+
+
+def parse(text):
+    jars, current = [], []
+    for raw in text.splitlines():
+        line = raw.strip()
+        if line.startswith(HEADER):
+            if current:
+                jars.append(CookieJar(current))
+            current = []
+            continue
+        if line.startswith(HTTPONLY_PREFIX):
+            line = line[len(HTTPONLY_PREFIX):]
+        elif not line or line.startswith("#"):
+            continue
+        current.append(line)
+    if current:
+        jars.append(CookieJar(current))
+    return jars
+
+
+class CookiePool:
+    def __init__(self, path=None, recheck=60):
+        self.path = path or COOKIES_FILE
+        self.recheck = recheck
+        self.jars = []
+        self.mtime = None
+        self.checked = 0
+        self.cursor = 0
+        self.lock = threading.Lock()
+        self.reload()
+        self.checked = time.time()
+
+    def reload(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            self.jars = []
+            return
+        if mtime == self.mtime:
+            return
+        with open(self.path) as f:
+            jars = parse(f.read())
+        # Earliest-expiring first: those jars are used while they still
+        # work and are the first to be dropped as time passes.
+        jars.sort(key=lambda jar: jar.expires or float("inf"))
+        self.jars = jars
+        self.mtime = mtime
+        self.cursor = 0
+
+    def _maybe_reload(self, now):
+        # Only stat the file every `recheck` seconds, never per request.
+        if now - self.checked > self.recheck:
+            self.checked = now
+            self.reload()
+
+    def acquire(self):
+        now = time.time()
+        with self.lock:
+            self._maybe_reload(now)
+            live = [jar for jar in self.jars if jar.usable(now)]
+            if not live:
+                return None
+            jar = live[self.cursor % len(live)]
+            self.cursor += 1
+            jar.uses += 1
+            return jar
+
+    def header(self):
+        jar = self.acquire()
+        return jar.header if jar else None
+
+    def success(self, jar):
+        with self.lock:
+            jar.failures = 0
+
+    def failure(self, jar):
+        with self.lock:
+            jar.failures += 1
+            if jar.failures >= COOKIE_MAX_FAILURES:
+                jar.quarantined_until = time.time() + COOKIE_QUARANTINE_TIME
+                jar.failures = 0
+
+    def status(self):
+        now = time.time()
+        return [
+            {
+                "jar": jar.id,
+                "expires_in": int(jar.expires - now) if jar.expires else None,
+                "usable": jar.usable(now),
+                "quarantined": now < jar.quarantined_until,
+                "uses": jar.uses,
+            }
+            for jar in self.jars
+        ]
+
+
+pool = CookiePool()
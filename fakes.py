@@ -0,0 +1,234 @@
+import itertools
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+
+# ------------------------------------
+# In-memory stand-ins for Mongo and the pyrogram client, used by the
+# benchmarks and for running the bots locally without Telegram or a
+# database.
+# ------------------------------------
+
+
+def _matches(doc, query):
+    for key, cond in query.items():
+        value = doc.get(key)
+        if isinstance(cond, dict):
+            for op, arg in cond.items():
+                if op == "$lte" and not (value is not None and value <= arg):
+                    return False
+                if op == "$lt" and not (value is not None and value < arg):
+                    return False
+                if op == "$gte" and not (value is not None and value >= arg):
+                    return False
+                if op == "$gt" and not (value is not None and value > arg):
+                    return False
+                if op == "$in" and value not in arg:
+                    return False
+        elif value != cond:
+            return False
+    return True
+
+
+class FakeCursor(list):
+    def sort(self, key, direction=1):
+        super().sort(key=lambda doc: doc.get(key), reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        return FakeCursor(self[:n]) if n else self
+
+    def batch_size(self, n):
+        return self
+
+
+class FakeCollection:
+    # Thread-safe, since the bots call pymongo from executor threads.
+    # Single-field indexes made with create_index (e.g. by ensure_indexes)
+    # are used for equality lookups, like a real unique user_id index.
+    def __init__(self):
+        self.docs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.RLock()
+        self.indexes = {}
+        self._lookup = {}  # field -> value -> {_id}
+
+    def create_index(self, keys, name=None, **options):
+        keys = [(keys, 1)] if isinstance(keys, str) else list(keys)
+        name = name or "_".join(f"{k}_{d}" for k, d in keys)
+        with self._lock:
+            self.indexes[name] = {"key": keys, **options}
+            field = keys[0][0]
+            if field != "_id" and field not in self._lookup:
+                self._lookup[field] = {}
+                for doc in self.docs.values():
+                    self._index(doc)
+        return name
+
+    def drop_index(self, name):
+        with self._lock:
+            self.indexes.pop(name)
+            fields = {spec["key"][0][0] for spec in self.indexes.values()}
+            for field in set(self._lookup) - fields:
+                del self._lookup[field]
+
+    def index_information(self):
+        return {"_id_": {"key": [("_id", 1)]}, **self.indexes}
+
+    def _index(self, doc):
+        for field, values in self._lookup.items():
+            if field in doc:
+                values.setdefault(doc[field], set()).add(doc["_id"])
+
+    def _unindex(self, doc):
+        for field, values in self._lookup.items():
+            ids = values.get(doc.get(field))
+            if ids is not None:
+                ids.discard(doc["_id"])
+                if not ids:
+                    del values[doc.get(field)]
+
+    def _candidates(self, query):
+        if "_id" in query and not isinstance(query["_id"], dict):
+            doc = self.docs.get(query["_id"])
+            return [doc] if doc is not None else []
+        for field, values in self._lookup.items():
+            if field in query and not isinstance(query[field], dict):
+                return [self.docs[i] for i in values.get(query[field], ())]
+        return list(self.docs.values())
+
+    def insert_one(self, doc):
+        doc = dict(doc)
+        with self._lock:
+            doc.setdefault("_id", next(self._ids))
+            self.docs[doc["_id"]] = doc
+            self._index(doc)
+        return SimpleNamespace(inserted_id=doc["_id"])
+
+    def insert_many(self, docs, ordered=True):
+        return SimpleNamespace(inserted_ids=[self.insert_one(doc).inserted_id for doc in docs])
+
+    def find(self, query=None, projection=None, **kwargs):
+        query = query or {}
+        with self._lock:
+            return FakeCursor(dict(d) for d in self._candidates(query) if _matches(d, query))
+
+    def find_one(self, query=None, projection=None, sort=None, **kwargs):
+        docs = self.find(query)
+        for key, direction in sort or ():
+            docs.sort(key, direction)
+        return docs[0] if docs else None
+
+    def update_one(self, query, update, upsert=False):
+        with self._lock:
+            for doc in self._candidates(query):
+                if _matches(doc, query):
+                    self._unindex(doc)
+                    break
+            else:
+                if not upsert:
+                    return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=None)
+                doc = {k: v for k, v in query.items() if not isinstance(v, dict)}
+                doc.setdefault("_id", next(self._ids))
+                self.docs[doc["_id"]] = doc
+            doc.update(update.get("$set", {}))
+            for key, amount in update.get("$inc", {}).items():
+                doc[key] = doc.get(key, 0) + amount
+            self._index(doc)
+        return SimpleNamespace(matched_count=1, modified_count=1, upserted_id=None)
+
+    def delete_one(self, query):
+        with self._lock:
+            for doc in self._candidates(query):
+                if _matches(doc, query):
+                    self._unindex(doc)
+                    del self.docs[doc["_id"]]
+                    return SimpleNamespace(deleted_count=1)
+        return SimpleNamespace(deleted_count=0)
+
+    def delete_many(self, query):
+        with self._lock:
+            docs = [doc for doc in self._candidates(query) if _matches(doc, query)]
+            for doc in docs:
+                self._unindex(doc)
+                del self.docs[doc["_id"]]
+        return SimpleNamespace(deleted_count=len(docs))
+
+    def count_documents(self, query):
+        return len(self.find(query))
+
+
+class FakeDatabase(dict):
+    def __missing__(self, name):
+        collection = self[name] = FakeCollection()
+        return collection
+
+
+class FakeClient:
+    # Records everything the handlers send instead of talking to Telegram.
+    def __init__(self, username="hinata_hyuga_bbot", user_id=1):
+        self.me = SimpleNamespace(id=user_id, username=username, first_name="hinata")
+        self.sent = deque(maxlen=100000)
+        self._message_ids = itertools.count(1)
+        self.floods = {}
+        self.deleted = deque(maxlen=100000)
+
+    async def get_me(self):
+        return self.me
+
+    def flood(self, chat_id, seconds):
+        # The next call for this chat raises FloodWait once.
+        self.floods[chat_id] = seconds
+
+    def _check_flood(self, chat_id):
+        seconds = self.floods.pop(chat_id, None)
+        if seconds is not None:
+            from pyrogram.errors import FloodWait
+
+            raise FloodWait(value=seconds)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self._check_flood(chat_id)
+        message = SimpleNamespace(id=next(self._message_ids), chat=SimpleNamespace(id=chat_id), text=text)
+        self.sent.append((chat_id, text, time.perf_counter()))
+        return message
+
+    async def delete_messages(self, chat_id, message_ids, **kwargs):
+        self._check_flood(chat_id)
+        message_ids = [message_ids] if isinstance(message_ids, int) else list(message_ids)
+        self.deleted.append((chat_id, message_ids, time.perf_counter()))
+        return len(message_ids)
+
+    async def edit_message_text(self, chat_id, message_id, text, **kwargs):
+        self._check_flood(chat_id)
+        self.sent.append((chat_id, text, time.perf_counter()))
+        return SimpleNamespace(id=message_id, chat=SimpleNamespace(id=chat_id), text=text)
+
+
+class FakeMessage:
+    # Carries the attributes pyrogram's filters look at, so real
+    # filters.private / filters.command / filters.mentioned work on it.
+    _ids = itertools.count(1)
+
+    def __init__(self, client, text, user_id=100, chat_id=None, first_name="Friend", private=True, mentioned=False):
+        from pyrogram.enums import ChatType
+
+        self._client = client
+        self.id = next(self._ids)
+        self.text = text
+        self.caption = None
+        self.command = text[1:].split() if text.startswith("/") else None
+        self.mentioned = mentioned
+        self.outgoing = False
+        self.reply_to_message = None
+        self.from_user = SimpleNamespace(id=user_id, first_name=first_name, username=None, is_self=False, is_bot=False)
+        self.chat = SimpleNamespace(
+            id=chat_id if chat_id is not None else user_id,
+            type=ChatType.PRIVATE if private else ChatType.SUPERGROUP,
+        )
+
+    async def reply(self, text, **kwargs):
+        return await self._client.send_message(self.chat.id, text, **kwargs)
+
+    reply_text = reply
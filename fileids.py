@@ -0,0 +1,158 @@
+import asyncio
+import time
+from collections import Counter, OrderedDict
+from os import getenv
+
+import metrics
+from lazy import lazy_mongo
+
+# ------------------------------------
+# Telegram file_id cache for rendered thumbnails.
+#
+#   photo = await fileids.send_photo(client, chat_id, videoid, await get_thumb(videoid), caption=...)
+#
+# The first send uploads cache/{videoid}.png and remembers the file_id
+# Telegram returns; every later send of the same card (any chat) reuses it,
+# so nothing is uploaded again. Kept in memory and persisted to the
+# file_ids collection (config.MONGO_DB_URI) so it survives restarts.
+# ------------------------------------
+
+FILEID_CACHE_SIZE = int(getenv("FILEID_CACHE_SIZE", "5000"))
+# Bump when the card design changes so old uploads aren't reused.
+RENDER_VERSION = "1"
+
+# Errors meaning the stored file_id can't be used any more.
+STALE_FILE_ERRORS = (
+    "FileReferenceExpired",
+    "FileReferenceInvalid",
+    "FileIdInvalid",
+    "MediaEmpty",
+    "MediaInvalid",
+)
+
+
+class FileIdCache:
+    def __init__(self, collection=None, size=None):
+        self.collection = collection
+        self.size = size or FILEID_CACHE_SIZE
+        self.memory = OrderedDict()
+        self.stats = Counter()
+        self._uploading = {}  # key -> [lock, callers holding or waiting for it]
+
+    @staticmethod
+    def key(videoid, profile="thumb"):
+        return f"{videoid}:{profile}:v{RENDER_VERSION}"
+
+    async def _db(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    def _remember(self, key, file_id):
+        self.memory[key] = file_id
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.size:
+            self.memory.popitem(last=False)
+
+    async def get(self, videoid, profile="thumb"):
+        key = self.key(videoid, profile)
+        file_id = self.memory.get(key)
+        if file_id is not None:
+            self.memory.move_to_end(key)
+            return file_id
+        if self.collection is not None:
+            doc = await self._db(self.collection.find_one, {"_id": key})
+            if doc:
+                self._remember(key, doc["file_id"])
+                return doc["file_id"]
+        return None
+
+    async def put(self, videoid, file_id, profile="thumb"):
+        key = self.key(videoid, profile)
+        self._remember(key, file_id)
+        if self.collection is not None:
+            await self._db(
+                self.collection.update_one,
+                {"_id": key},
+                {"$set": {"file_id": file_id, "time": time.time()}},
+                True,
+            )
+
+    async def forget(self, videoid, profile="thumb"):
+        key = self.key(videoid, profile)
+        self.memory.pop(key, None)
+        if self.collection is not None:
+            await self._db(self.collection.delete_one, {"_id": key})
+
+    async def send_photo(self, client, chat_id, videoid, photo, profile="thumb", **kwargs):
+        # `photo` is what get_thumb returned: a local path or a fallback URL.
+        if not isinstance(photo, str) or photo.startswith(("http://", "https://")):
+            return await client.send_photo(chat_id, photo, **kwargs)
+
+        message = await self._send_cached(client, chat_id, videoid, profile, kwargs)
+        if message is not None:
+            return message
+
+        # Only one upload per card: chats asking for it at the same time wait
+        # for the first upload and then reuse its file_id.
+        key = self.key(videoid, profile)
+        entry = self._uploading.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                message = await self._send_cached(client, chat_id, videoid, profile, kwargs)
+                if message is not None:
+                    return message
+                self.stats["uploads"] += 1
+                message = await client.send_photo(chat_id, photo, **kwargs)
+                if getattr(message, "photo", None):
+                    await self.put(videoid, message.photo.file_id, profile)
+                return message
+        finally:
+            # Drop the lock only once nobody is queued on it, or a later
+            # caller would get a fresh one and upload in parallel.
+            entry[1] -= 1
+            if not entry[1]:
+                del self._uploading[key]
+
+    async def _send_cached(self, client, chat_id, videoid, profile, kwargs):
+        file_id = await self.get(videoid, profile)
+        if file_id is None:
+            return None
+        try:
+            message = await client.send_photo(chat_id, file_id, **kwargs)
+        except Exception as e:
+            if type(e).__name__ not in STALE_FILE_ERRORS:
+                raise
+            self.stats["stale"] += 1
+            await self.forget(videoid, profile)
+            return None
+        self.stats["hits"] += 1
+        return message
+
+    def report(self):
+        sent = self.stats["hits"] + self.stats["uploads"]
+        return {
+            **self.stats,
+            "cached": len(self.memory),
+            "hit_rate": self.stats["hits"] / sent if sent else 0.0,
+        }
+
+
+fileids = FileIdCache()
+metrics.gauge("fileids.uploads", lambda: fileids.stats["uploads"])
+metrics.gauge("fileids.hits", lambda: fileids.stats["hits"])
+
+
+def _mongo_uri():
+    # Read when the first lookup connects, after config has loaded .env.
+    from config import MONGO_DB_URI
+
+    return MONGO_DB_URI
+
+
+def use_mongo(collection):
+    # Persist to another collection (or None for memory only).
+    fileids.collection = collection
+    return fileids
+
+
+use_mongo(lazy_mongo(_mongo_uri, "telegram_bot_db")["file_ids"])
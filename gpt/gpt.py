@@ -1,9 +1,16 @@
 import os
 from pyrogram import Client, filters
-import openai
+
+from breaker import register_breaker
+from llm import breaker as openai_breaker
+from llm import get_chatgpt_response, set_api_key, watch_backend
+from metrics import register_stats, serve, timed
+from outbox import Outbox
+from pipeline import RESPOND_LIMIT, STOP, Pipeline, RateLimiter, bot_user, bot_username, rate_limit
+from profiler import register_profiler
 
 # Set up your OpenAI API key here
-openai.api_key = 'YOUR_OPENAI_API_KEY'
+set_api_key('YOUR_OPENAI_API_KEY')
 
 # Your Telegram API Credentials
 api_id = YOUR_API_ID  # Get it from https://my.telegram.org
@@ -12,28 +19,50 @@ string_session = "YOUR_STRING_SESSION"
 
 # Initialize the bot
 bot = Client("assistant_bot", api_id=api_id, api_hash=api_hash, session_string=string_session)
+outbox = Outbox(bot)  # Replies go out through here, paced per chat
 
 @bot.on_message(filters.command("start"))
-def start(client, message):
-    message.reply_text("Hey there! I'm your friendly AssistantBot. Aap mujhse kisi bhi cheez ke liye baat kar sakte hain!")
+async def start(client, message):
+    outbox.reply(message, "Hey there! I'm your friendly AssistantBot. Aap mujhse kisi bhi cheez ke liye baat kar sakte hain!")
 
-@bot.on_message(filters.text & filters.mentioned)
-def mention_handler(client, message):
-    user_message = message.text
-    bot_name = client.get_me().username
+limiter = RateLimiter()
 
+async def strip_mention(ctx):
     # Stripping the bot name from the message
-    user_query = user_message.replace(f"@{bot_name}", "").strip()
+    bot_name = await bot_username(ctx.client)
+    ctx.text = ctx.text.replace(f"@{bot_name}", "").strip()
+    if not ctx.text:
+        return STOP
+
+async def ignore_self(ctx):
+    # Ignore messages from the bot itself
+    if not ctx.text or ctx.user_id == (await bot_user(ctx.client)).id:
+        return STOP
+
+async def respond(ctx):
+    # Get a response from OpenAI
+    response = await ctx.pipeline.offload(get_openai_response, ctx.text)
 
-    # Get a response from OpenAI if user query is not empty
-    if user_query:
-        response = get_openai_response(user_query)
+    # Determine the response language based on the user's input
+    if is_hinglish(ctx.text):
+        outbox.reply(ctx.message, response)  # Assistant response in Hinglish if user is in Hinglish
+    else:
+        outbox.reply(ctx.message, response)  # Assistant response in English if user is in English
 
-        # Determine the response language based on the user's input
-        if is_hinglish(user_query):
-            message.reply_text(response)  # Assistant response in Hinglish if user is in Hinglish
-        else:
-            message.reply_text(response)  # Assistant response in English if user is in English
+mentions = Pipeline("mention")
+mentions.add("parse", strip_mention)
+mentions.add("rate_limit", rate_limit(limiter))
+mentions.add("respond", respond, limit=RESPOND_LIMIT)
+
+chats = Pipeline("chat")
+chats.add("parse", ignore_self)
+chats.add("rate_limit", rate_limit(limiter))
+chats.add("respond", respond, limit=RESPOND_LIMIT)
+
+@bot.on_message(filters.text & filters.mentioned)
+@timed()
+async def mention_handler(client, message):
+    return await mentions.submit(client, message)
 
 def is_hinglish(text):
     """A simple function to detect if the text is Hinglish."""
@@ -45,34 +74,28 @@ def is_hinglish(text):
     return hindi_word_count > 0
 
 def get_openai_response(query):
+    # Fails fast (or answers from cache) while the OpenAI circuit breaker is open
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",  # You can replace it with the latest available model
-            messages=[
-                {"role": "user", "content": query}
-            ]
-        )
-        return response.choices[0].message['content'].strip()
+        return get_chatgpt_response(query)
     except Exception as e:
         return "I'm sorry, I couldn't process your request right now. Please try again."
 
 # Additional command for casual conversation
 @bot.on_message(filters.text)
-def chat_response(client, message):
-    user_message = message.text.strip()
+@timed()
+async def chat_response(client, message):
+    return await chats.submit(client, message)
 
-    # Ignore messages from the bot itself
-    if message.from_user.id == client.get_me().id:
-        return
-
-    # Get a response from OpenAI
-    if user_message:
-        response = get_openai_response(user_message)
-        # Similar detection of response language
-        if is_hinglish(user_message):
-            message.reply_text(response)  # Assistant responds in Hinglish
-        else:
-            message.reply_text(response)  # Assistant responds in English
+def setup(primary=True):
+    # Owner commands and background jobs. shards.py calls this in every
+    # worker process, with primary=True only in the first one.
+    register_stats(bot)
+    register_profiler(bot)
+    register_breaker(bot, openai_breaker)
+    bot.loop.create_task(outbox.start())  # Deliver queued replies
+    bot.loop.create_task(watch_backend())  # Probe OpenAI while the breaker is open
 
 if __name__ == "__main__":
+    setup()
+    serve()
     bot.run()
\ No newline at end of file
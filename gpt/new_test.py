@@ -15,28 +15,44 @@ Let's refine your Telegram bot further, enhancing its functionality, removing an
 Below is the revised implementation of your Telegram bot with advanced features and optimized code:
 
 ```python
+import logging
 import os
-import openai
-from langdetect import detect, DetectorFactory
-from pymongo import MongoClient
 from pyrogram import Client, filters
 import random
 from datetime import datetime, timedelta
 import asyncio
 import config  # Assuming your configurations are in this file
-
+from autoclean import cleaner, register_autoclean
+from breaker import register_breaker
+from broadcast import register_broadcast
+from indexes import ensure_indexes
+from lazy import lazy_import, lazy_mongo
+from llm import breaker as openai_breaker
+from llm import get_chatgpt_response, set_api_key, watch_backend
+from metrics import register_stats, serve, timed, track
+from outbox import Outbox
+from pipeline import DETECT_LIMIT, PERSIST_LIMIT, RESPOND_LIMIT, STOP, Pipeline, RateLimiter, bot_username, rate_limit
+from profiler import register_profiler
+
+logger = logging.getLogger(__name__)
+
+# Heavy clients are imported on first use to keep startup fast
 # Ensure consistent language detection results
-DetectorFactory.seed = 0
+langdetect = lazy_import("langdetect", on_load=lambda m: setattr(m.DetectorFactory, "seed", 0))
+
+def detect(text):
+    return langdetect.detect(text)
 
 # Set up OpenAI API key
-openai.api_key = config.OPENAI_API_KEY
+set_api_key(config.OPENAI_API_KEY)
 
-# MongoDB connection URI
-mongo_client = MongoClient(config.MONGODB_CONNECTION_STRING)
-db = mongo_client['telegram_bot_db']
+# MongoDB connection URI (connects on the first query)
+db = lazy_mongo(lambda: config.MONGODB_CONNECTION_STRING, 'telegram_bot_db')
 users_collection = db['users']
 feedback_collection = db['feedbacks']  # Collection for feedback management
 reminders_collection = db['reminders']  # Collection for reminders
+broadcasts_collection = db['broadcasts']  # Broadcast checkpoints
+cleaner.use_mongo(db['autoclean'])  # Bot messages waiting to be auto-deleted
 
 # Create a client instance for this bot
 api_id = config.API_ID
@@ -44,6 +60,7 @@ api_hash = config.API_HASH
 string_session = config.STRING_SESSION
 
 app = Client("my_account", api_id, api_hash, session_string=string_session)
+outbox = Outbox(app)  # Replies go out through here, paced per chat
 
 # User control variable for enabling/disabling ChatGPT
 chatgpt_enabled = config.ENABLE_CHATGPT
@@ -72,7 +89,17 @@ def random_quote():
     ]
     return random.choice(quotes)
 
+# Used when OpenAI is down (circuit breaker open) and there's no cached answer
+def degraded_response(message_text: str, username: str) -> str:
+    casual_response = casual_responses(message_text, username)
+    if casual_response:
+        return casual_response
+    if random.random() < 0.5:
+        return f"My brain is taking a little nap right now, {username} 😴 Here's a joke while it wakes up: {random_joke()}"
+    return f"I can't answer that right now, {username}, but here's a quote to keep you going: \"{random_quote()}\" 🌟"
+
 # Function to save user data or create a new profile
+@timed("mongo.save_user_data", "external")
 def save_user_data(user_id, username, language='en'):
     users_collection.update_one(
         {"user_id": user_id},
@@ -80,71 +107,88 @@ def save_user_data(user_id, username, language='en'):
         upsert=True
     )
 
-@app.on_message(filters.private & filters.text)
-def handle_private_message(client, message):
-    user_id = message.from_user.id
-    username = message.from_user.first_name or "Friend"
-    
-    user_message = message.text.strip()
+# Handler pipeline stages. Blocking ones run on the pipeline's thread pool.
+limiter = RateLimiter()
 
-    save_user_data(user_id, username)  # Update user info
+def persist_user(ctx):
+    save_user_data(ctx.user_id, ctx.username)  # Update user info
 
-    # Detect language to respond accordingly
+def detect_language(ctx):
     try:
-        language = detect(user_message)
-        if language not in ['en', 'hi', 'bn', 'gu', 'ta']:
-            message.reply("I'm only available in English, Hindi, Bengali, Gujarati, and Tamil. Please use one of these languages. 😊")
-            return
+        ctx.language = detect(ctx.text)
     except Exception as e:
         logger.error(f"Language detection error: {e}")
-        message.reply("Sorry, I couldn't understand that. Could you please rephrase? 🤔")
-        return
+        ctx.language = None
+
+async def respond_private(ctx):
+    message = ctx.message
+    user_message = ctx.text
+    username = ctx.username
+
+    # Detect language to respond accordingly
+    if ctx.language is None:
+        outbox.reply(message, "Sorry, I couldn't understand that. Could you please rephrase? 🤔")
+        return STOP
+    if ctx.language not in ['en', 'hi', 'bn', 'gu', 'ta']:
+        outbox.reply(message, "I'm only available in English, Hindi, Bengali, Gujarati, and Tamil. Please use one of these languages. 😊")
+        return STOP
 
     if not chatgpt_enabled:
-        message.reply("ChatGPT functionality is currently disabled. Please check back later! 🙁")
+        outbox.reply(message, "ChatGPT functionality is currently disabled. Please check back later! 🙁")
         return
 
     casual_response = casual_responses(user_message, username)
     if casual_response:
-        message.reply(casual_response)
+        outbox.reply(message, casual_response)
         return
 
     if user_message.lower() == "/joke":
         joke = random_joke()
-        message.reply(f"Here's a joke for you: {joke}")
+        outbox.reply(message, f"Here's a joke for you: {joke}")
         return
 
     if user_message.lower() == "/quote":
         quote = random_quote()
-        message.reply(f"Here’s a quote for inspiration: \"{quote}\"")
+        outbox.reply(message, f"Here’s a quote for inspiration: \"{quote}\"")
         return
 
     # Retrieve response from OpenAI
     try:
-        assistant_response = get_chatgpt_response(user_message)
-        message.reply(f"Here's what I found for you, {username}: \n\n{assistant_response}\n\nLet me know if you need anything else! 😊")
+        assistant_response = await private_chat.offload(get_chatgpt_response, user_message)
+        outbox.reply(message, f"Here's what I found for you, {username}: \n\n{assistant_response}\n\nLet me know if you need anything else! 😊")
     except Exception as e:
         logger.error(f"Error getting ChatGPT response: {e}")
-        message.reply("Oops! Something went wrong while processing your request. Please try again later. 🤖")
+        outbox.reply(message, degraded_response(user_message, username))
+
+private_chat = Pipeline("private")
+private_chat.add("rate_limit", rate_limit(limiter))
+private_chat.add("persist", persist_user, limit=PERSIST_LIMIT, blocking=True, background=True)
+private_chat.add("detect", detect_language, limit=DETECT_LIMIT, blocking=True)
+private_chat.add("respond", respond_private, limit=RESPOND_LIMIT)
+
+@app.on_message(filters.private & filters.text)
+@timed()
+async def handle_private_message(client, message):
+    return await private_chat.submit(client, message)
 
 @app.on_message(filters.command("set_language") & filters.private)
-def set_language(client, message):
+async def set_language(client, message):
     user_id = message.from_user.id
     new_language = message.command[1] if len(message.command) > 1 else None
 
     if new_language and new_language in ['en', 'hi', 'bn', 'gu', 'ta']:
-        save_user_data(user_id, message.from_user.first_name, new_language)
-        message.reply(f"Your preferred language has been set to {new_language}! 🌐")
+        await private_chat.offload(save_user_data, user_id, message.from_user.first_name, new_language)
+        outbox.reply(message, f"Your preferred language has been set to {new_language}! 🌐")
     else:
-        message.reply("Please provide a valid language code: `en`, `hi`, `bn`, `gu`, or `ta`.")
+        outbox.reply(message, "Please provide a valid language code: `en`, `hi`, `bn`, `gu`, or `ta`.")
 
 @app.on_message(filters.command("remind_me") & filters.private)
-def set_reminder(client, message):
+async def set_reminder(client, message):
     user_id = message.from_user.id
     try:
         parts = message.text.split(maxsplit=2)
         if len(parts) < 3:
-            message.reply("Please provide a time and reminder message. Usage: `/remind_me <time in minutes> <message>`")
+            outbox.reply(message, "Please provide a time and reminder message. Usage: `/remind_me <time in minutes> <message>`")
             return
         
         time_in_minutes = int(parts[1])
@@ -152,35 +196,43 @@ def set_reminder(client, message):
 
         # Schedule the reminder
         reminder_time = datetime.now() + timedelta(minutes=time_in_minutes)
-        reminders_collection.insert_one({"user_id": user_id, "message": reminder_message, "time": reminder_time})
+        await private_chat.offload(reminders_collection.insert_one, {"user_id": user_id, "message": reminder_message, "time": reminder_time})
 
-        message.reply(f"Reminder set for {time_in_minutes} minutes from now! ⏰")
+        outbox.reply(message, f"Reminder set for {time_in_minutes} minutes from now! ⏰")
     except ValueError:
-        message.reply("Please provide a valid number for time in minutes. 📅")
+        outbox.reply(message, "Please provide a valid number for time in minutes. 📅")
+
+def due_reminders(now):
+    with track("mongo.due_reminders"):
+        return list(reminders_collection.find({"time": {"$lte": now}}))
 
 async def send_reminders():
     while True:
         now = datetime.now()
-        reminders = reminders_collection.find({"time": {"$lte": now}})
-        for reminder in reminders:
-            user_id = reminder['user_id']
-            message = reminder['message']
-            await app.send_message(chat_id=user_id, text=f"⏰ Reminder: {message}")
-            reminders_collection.delete_one({"_id": reminder['_id']})
+        reminders = await private_chat.offload(due_reminders, now)
+        # Queue them all at once; the outbox spaces them out per chat and
+        # rides out FloodWaits without holding up the other reminders.
+        sends = [outbox.send(reminder['user_id'], f"⏰ Reminder: {reminder['message']}") for reminder in reminders]
+        results = await asyncio.gather(*sends, return_exceptions=True)
+        for reminder, result in zip(reminders, results):
+            if isinstance(result, Exception):
+                logger.error(f"Reminder to {reminder['user_id']} failed: {result}")
+                continue
+            await private_chat.offload(reminders_collection.delete_one, {"_id": reminder['_id']})
         await asyncio.sleep(60)  # Check every minute for reminders
 
 @app.on_message(filters.command("feedback") & filters.private)
-def provide_feedback(client, message):
+async def provide_feedback(client, message):
     user_id = message.from_user.id
     feedback_text = message.text[9:].strip()  # Extract feedback after command
     if not feedback_text:
-        message.reply("Please provide your feedback. Usage: `/feedback <your feedback>`")
+        outbox.reply(message, "Please provide your feedback. Usage: `/feedback <your feedback>`")
         return
-    feedback_collection.insert_one({"user_id": user_id, "feedback": feedback_text})
-    message.reply("Thank you for your feedback! We appreciate it. 💕")
+    await private_chat.offload(feedback_collection.insert_one, {"user_id": user_id, "feedback": feedback_text, "created_at": datetime.now()})
+    outbox.reply(message, "Thank you for your feedback! We appreciate it. 💕")
 
 @app.on_message(filters.command("menu") & filters.private)
-def display_menu(client, message):
+async def display_menu(client, message):
     menu_text = (
         "Here's what I can do for you! 🎉\n\n"
         "/help - Ask for help\n"
@@ -190,39 +242,61 @@ def display_menu(client, message):
         "/set_language <language> - Set your preferred language for interactions\n"
         "/remind_me <time in minutes> <message> - Set a reminder\n""/feedback <your feedback> - Provide feedback\n"
     )
-    message.reply(menu_text)
+    outbox.reply(message, menu_text)
 
-@app.on_message(filters.group & filters.text)
-def handle_group_message(client, message):
-    user = message.from_user
-    username = user.first_name if user else "Friend"
-
-    if (client.get_me().username in message.text) or ("assistant" in message.text.lower()):
-        logger.info(f"Group message from {username}: {message.text}")
-
-        try:
-            language = detect(message.text)
-            if language not in ['en', 'hi', 'bn', 'gu', 'ta']:
-                message.reply("I'm truly sorry, but I only understand English, Hindi, Bengali, Gujarati, and Tamil. Please use one of those languages. 😊")
-                return
-        except Exception as e:
-            logger.error(f"Language detection error: {e}")
-            return
+async def mentioned(ctx):
+    text = ctx.message.text
+    if not ((await bot_username(ctx.client)) in text or "assistant" in text.lower()):
+        return STOP
+    logger.info(f"Group message from {ctx.username}: {text}")
 
-        if not chatgpt_enabled:
-            return
+async def supported_language(ctx):
+    if ctx.language not in ['en', 'hi', 'bn', 'gu', 'ta']:
+        if ctx.language is not None:
+            outbox.reply(ctx.message, "I'm truly sorry, but I only understand English, Hindi, Bengali, Gujarati, and Tamil. Please use one of those languages. 😊")
+        return STOP
 
-        save_user_data(user.id, username)
+    if not chatgpt_enabled:
+        return STOP
+
+def autoclean_reply(sent):
+    # Done callback for outbox replies: auto-delete the reply once it's out
+    if not sent.cancelled() and sent.exception() is None:
+        cleaner.track(sent.result())
+
+async def respond_group(ctx):
+    custom_response = await group_chat.offload(get_custom_response, ctx.user_id, ctx.message.text)
+    if custom_response:
+        reply = outbox.reply(ctx.message, custom_response)
+        if config.AUTOCLEAN_GROUPS:
+            reply.add_done_callback(autoclean_reply)
+        return
 
-        custom_response = get_custom_response(user.id, message.text)
-        if custom_response:
-            message.reply(custom_response)
-            return
+    try:
+        assistant_response = await group_chat.offload(get_chatgpt_response, ctx.message.text)
+    except Exception as e:
+        logger.error(f"Error getting ChatGPT response: {e}")
+        outbox.reply(ctx.message, degraded_response(ctx.message.text, ctx.username))
+        return
+    group_response = f"Hey everyone! 💖 I just got asked something interesting:\n\n{assistant_response}\n\nFeel free to ask me anything else, I'm here to help! 😊"
+    reply = outbox.reply(ctx.message, group_response)
+    if config.AUTOCLEAN_GROUPS:
+        reply.add_done_callback(autoclean_reply)  # Keep busy groups tidy
+
+group_chat = Pipeline("group")
+group_chat.add("parse", mentioned)
+group_chat.add("rate_limit", rate_limit(limiter))
+group_chat.add("detect", detect_language, limit=DETECT_LIMIT, blocking=True)
+group_chat.add("language", supported_language)
+group_chat.add("persist", persist_user, limit=PERSIST_LIMIT, blocking=True, background=True)
+group_chat.add("respond", respond_group, limit=RESPOND_LIMIT)
 
-        assistant_response = get_chatgpt_response(message.text)
-        group_response = f"Hey everyone! 💖 I just got asked something interesting:\n\n{assistant_response}\n\nFeel free to ask me anything else, I'm here to help! 😊"
-        message.reply(group_response)
+@app.on_message(filters.group & filters.text)
+@timed()
+async def handle_group_message(client, message):
+    return await group_chat.submit(client, message)
 
+@timed("mongo.get_custom_response", "external")
 def get_custom_response(user_id, message_text):
     user_data = users_collection.find_one({"user_id": user_id})
     if user_data and "custom_responses" in user_data:
@@ -230,9 +304,28 @@ def get_custom_response(user_id, message_text):
         return custom_responses.get(message_text.lower())
     return None
 
+def setup(primary=True):
+    # Owner commands and background jobs. shards.py calls this in every
+    # worker process, with primary=True only in the first one.
+    if primary:
+        # Off the startup path: Mongo may be slow to answer or down
+        app.loop.run_in_executor(None, ensure_indexes, db)
+    register_stats(app)
+    register_profiler(app)
+    register_broadcast(app, users_collection, broadcasts_collection)
+    register_breaker(app, openai_breaker)
+    register_autoclean(app)
+    app.loop.create_task(outbox.start())  # Deliver queued replies and reminders
+    if primary:
+        app.loop.create_task(send_reminders())  # Start reminders in the background
+    # Every process sweeps what it tracked; only the primary reloads what was pending
+    app.loop.create_task(cleaner.start(app, restore=primary))
+    app.loop.create_task(watch_backend())  # Probe OpenAI while the breaker is open
+
 if __name__ == "__main__":
     logger.info("Starting the bot...")
-    app.loop.create_task(send_reminders())  # Start reminders in the background
+    setup()
+    serve()
     app.run()
 ```
 
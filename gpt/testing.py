@@ -1,20 +1,32 @@
+import logging
 import os
-import openai
-from langdetect import detect, DetectorFactory
-from pymongo import MongoClient
 from pyrogram import Client, filters
 import random
 import config  # Assuming your configurations are in this file
-
+from breaker import register_breaker
+from indexes import REQUIRED, ensure_indexes
+from lazy import lazy_import, lazy_mongo
+from llm import breaker as openai_breaker
+from llm import get_chatgpt_response, set_api_key, watch_backend
+from metrics import register_stats, serve, timed
+from outbox import Outbox
+from pipeline import DETECT_LIMIT, PERSIST_LIMIT, RESPOND_LIMIT, STOP, Pipeline, RateLimiter, bot_username, rate_limit
+from profiler import register_profiler
+
+logger = logging.getLogger(__name__)
+
+# Heavy clients are imported on first use to keep startup fast
 # Ensure consistent language detection results
-DetectorFactory.seed = 0
+langdetect = lazy_import("langdetect", on_load=lambda m: setattr(m.DetectorFactory, "seed", 0))
+
+def detect(text):
+    return langdetect.detect(text)
 
 # Set up OpenAI API key
-openai.api_key = config.OPENAI_API_KEY
+set_api_key(config.OPENAI_API_KEY)
 
-# MongoDB connection URI
-mongo_client = MongoClient(config.MONGODB_CONNECTION_STRING)
-db = mongo_client['telegram_bot_db']
+# MongoDB connection URI (connects on the first query)
+db = lazy_mongo(lambda: config.MONGODB_CONNECTION_STRING, 'telegram_bot_db')
 users_collection = db['users']
 
 # Create a client instance for this bot
@@ -23,6 +35,7 @@ api_hash = config.API_HASH
 string_session = config.STRING_SESSION
 
 app = Client("my_account", api_id, api_hash, session_string=string_session)
+outbox = Outbox(app)  # Replies go out through here, paced per chat
 
 # User control variable for enabling/disabling ChatGPT
 chatgpt_enabled = config.ENABLE_CHATGPT
@@ -62,113 +75,172 @@ def random_quote():
     ]
     return random.choice(quotes)
 
-@app.on_message(filters.private & filters.text)
-def handle_private_message(client, message):
-    user_id = message.from_user.id
-    username = message.from_user.first_name or "Friend"
-
+# Used when OpenAI is down (circuit breaker open) and there's no cached answer
+def degraded_response(message_text: str, username: str) -> str:
+    casual_response = casual_responses(message_text, username)
+    if casual_response:
+        return casual_response
+    if random.random() < 0.5:
+        return f"My brain is taking a little nap right now, {username} 😴 Here's a joke while it wakes up: {random_joke()}"
+    return f"I can't answer that right now, {username}, but here's a quote to keep you going: \"{random_quote()}\" 🌟"
+
+def save_user_data(user_id, username, language='en'):
+    users_collection.update_one(
+        {"user_id": user_id},
+        {"$set": {"username": username, "language": language}},
+        upsert=True
+    )
+
+# Handler pipeline stages. Blocking ones run on the pipeline's thread pool.
+limiter = RateLimiter()
+
+def persist_user(ctx):
     # Save or update user data in MongoDB when they interact with the bot
-    save_user_data(user_id, username)
+    save_user_data(ctx.user_id, ctx.username)
 
-    user_message = message.text.strip()
-
-    # Detect language
+def detect_language(ctx):
     try:
-        language = detect(user_message)
-        if language not in ['en', 'hi', 'bn', 'gu', 'ta']:
-            message.reply("I'm really sorry, but I only understand English, Hindi, Bengali, Gujarati, and Tamil. Could you please use one of those languages? 😊")
-            return
+        ctx.language = detect(ctx.text)
     except Exception as e:
         logger.error(f"Language detection error: {e}")
-        message.reply("Oh no! I didn't understand that. Can you please rephrase it? 🤔")
-        return
+        ctx.language = None
+
+async def respond_private(ctx):
+    message = ctx.message
+    user_message = ctx.text
+    username = ctx.username
+
+    if ctx.language is None:
+        outbox.reply(message, "Oh no! I didn't understand that. Can you please rephrase it? 🤔")
+        return STOP
+    if ctx.language not in ['en', 'hi', 'bn', 'gu', 'ta']:
+        outbox.reply(message, "I'm really sorry, but I only understand English, Hindi, Bengali, Gujarati, and Tamil. Could you please use one of those languages? 😊")
+        return STOP
 
     # Check for casual conversation responses
     casual_response = casual_responses(user_message, username)
     if casual_response:
-        message.reply(casual_response)
+        outbox.reply(message, casual_response)
         return
 
     # Special commands for jokes and quotes
     if user_message.lower() == "/joke":
         joke = random_joke()
-        message.reply(f"Here's a joke for you: {joke}")
+        outbox.reply(message, f"Here's a joke for you: {joke}")
         return
 
     if user_message.lower() == "/quote":
         quote = random_quote()
-        message.reply(f"Here’s a quote for inspiration: \"{quote}\"")
+        outbox.reply(message, f"Here’s a quote for inspiration: \"{quote}\"")
         return
 
     # If chatgpt is disabled, inform the user
     if not chatgpt_enabled:
-        message.reply("The ChatGPT functionality is currently disabled. Please try again later!")
+        outbox.reply(message, "The ChatGPT functionality is currently disabled. Please try again later!")
         return
 
     # Get the chatbot response
-    assistant_response = get_chatgpt_response(user_message)
+    try:
+        assistant_response = await private_chat.offload(get_chatgpt_response, user_message)
+    except Exception as e:
+        logger.error(f"ChatGPT unavailable: {e}")
+        outbox.reply(message, degraded_response(user_message, username))
+        return
 
     # Personalize the response to sound friendly
     personalized_response = f"Hey {username}! ✨ I found this response for your question:\n\n{assistant_response}\n\nIf you found that useful, let me know! I'm here to help! 😊"
 
     # Reply to the user
-    message.reply(personalized_response)
-
-@app.on_message(filters.group & filters.text)
-def handle_group_message(client, message):
-    user = message.from_user
-    username = user.first_name if user else "Friend"
+    outbox.reply(message, personalized_response)
 
+async def mentioned(ctx):
     # Check if the bot is mentioned by username or keywords:
-    if (client.get_me().username in message.text) or ("assistant" in message.text.lower()):
-        logger.info(f"Group message from {username}: {message.text}")
-
-        # Detect language
-        try:
-            language = detect(message.text)
-            if language not in ['en', 'hi', 'bn', 'gu', 'ta']:
-                message.reply("I'm truly sorry, but I only understand English, Hindi, Bengali, Gujarati, and Tamil. Please use one of those languages. 😊")
-                return
-        except Exception as e:
-            logger.error(f"Language detection error: {e}")
-            return  # Don't respond if there's a detection error
+    text = ctx.message.text
+    if not ((await bot_username(ctx.client)) in text or "assistant" in text.lower()):
+        return STOP
+    logger.info(f"Group message from {ctx.username}: {text}")
+
+async def supported_language(ctx):
+    if ctx.language not in ['en', 'hi', 'bn', 'gu', 'ta']:
+        if ctx.language is not None:
+            outbox.reply(ctx.message, "I'm truly sorry, but I only understand English, Hindi, Bengali, Gujarati, and Tamil. Please use one of those languages. 😊")
+        return STOP  # Don't respond if there's a detection error
+
+async def respond_group(ctx):
+    # Get response from OpenAI for the group message
+    try:
+        assistant_response = await group_chat.offload(get_chatgpt_response, ctx.message.text)
+    except Exception as e:
+        logger.error(f"ChatGPT unavailable: {e}")
+        outbox.reply(ctx.message, degraded_response(ctx.message.text, ctx.username))
+        return
 
-        # Save user data when they interact in the group
-        save_user_data(user.id, username)
+    # Respond in the group chat
+    group_response = f"Hey everyone! 💖 I just got asked something interesting:\n\n{assistant_response}\n\nFeel free to ask me anything else, I'm here to help! 😊"
+    outbox.reply(ctx.message, group_response)
+
+private_chat = Pipeline("private")
+private_chat.add("rate_limit", rate_limit(limiter))
+private_chat.add("persist", persist_user, limit=PERSIST_LIMIT, blocking=True, background=True)
+private_chat.add("detect", detect_language, limit=DETECT_LIMIT, blocking=True)
+private_chat.add("respond", respond_private, limit=RESPOND_LIMIT)
+
+group_chat = Pipeline("group")
+group_chat.add("parse", mentioned)
+group_chat.add("rate_limit", rate_limit(limiter))
+group_chat.add("detect", detect_language, limit=DETECT_LIMIT, blocking=True)
+group_chat.add("language", supported_language)
+# Save user data when they interact in the group
+group_chat.add("persist", persist_user, limit=PERSIST_LIMIT, blocking=True, background=True)
+group_chat.add("respond", respond_group, limit=RESPOND_LIMIT)
 
-        # Get response from OpenAI for the group message
-        assistant_response = get_chatgpt_response(message.text)
+@app.on_message(filters.private & filters.text)
+@timed()
+async def handle_private_message(client, message):
+    return await private_chat.submit(client, message)
 
-        # Respond in the group chat
-        group_response = f"Hey everyone! 💖 I just got asked something interesting:\n\n{assistant_response}\n\nFeel free to ask me anything else, I'm here to help! 😊"
-        message.reply(group_response)
+@app.on_message(filters.group & filters.text)
+@timed()
+async def handle_group_message(client, message):
+    return await group_chat.submit(client, message)
 
 # Owner-specific command for management or personal queries
 OWNER_ID = config.OWNER_ID  # Assuming you have this in your config.py
 
 @app.on_message(filters.command("toggle_chatgpt") & filters.private)
-def toggle_chatgpt(client, message):
+async def toggle_chatgpt(client, message):
     global chatgpt_enabled  # Declare a global variable to toggle the ChatGPT functionality
     if message.from_user.id == OWNER_ID:
-        global chatgpt_enabled  # Declare a global variable to toggle the ChatGPT functionality
         chatgpt_enabled = not chatgpt_enabled
         status = "enabled" if chatgpt_enabled else "disabled"
-        message.reply(f"ChatGPT functionality has been {status}.")
+        outbox.reply(message, f"ChatGPT functionality has been {status}.")
     else:
-        message.reply("Sorry, this command is only accessible to the owner! 🙅‍♀️")
+        outbox.reply(message, "Sorry, this command is only accessible to the owner! 🙅‍♀️")
 
 # New owner command for restarting the bot (can be expanded for other management functions)
 @app.on_message(filters.command("restart") & filters.private)
-def restart_bot(client, message):
+async def restart_bot(client, message):
     if message.from_user.id == OWNER_ID:
-        message.reply("Restarting the bot...")
-        # Logic to restart can include stopping and starting the app again
-        client.stop()
-        client.start()  # This is just a placeholder; actual restart logic may vary
-        message.reply("The bot has been restarted successfully! 😊")
+        await outbox.reply(message, "Restarting the bot...")
+        # Stopping from inside a handler would wait on this handler, so don't block
+        await client.restart(block=False)
     else:
-        message.reply("Sorry, this command is only accessible to the owner! 🙅‍♀️")
+        outbox.reply(message, "Sorry, this command is only accessible to the owner! 🙅‍♀️")
+
+def setup(primary=True):
+    # Owner commands and background jobs. shards.py calls this in every
+    # worker process, with primary=True only in the first one.
+    if primary:
+        # Off the startup path: Mongo may be slow to answer or down
+        app.loop.run_in_executor(None, ensure_indexes, db, {"users": REQUIRED["users"]})
+    register_stats(app)
+    register_profiler(app)
+    register_breaker(app, openai_breaker)
+    app.loop.create_task(outbox.start())  # Deliver queued replies
+    app.loop.create_task(watch_backend())  # Probe OpenAI while the breaker is open
 
 if __name__ == "__main__":
     logger.info("Starting the bot...")
+    setup()
+    serve()
     app.run()
\ No newline at end of file
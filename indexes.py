@@ -0,0 +1,167 @@
+import argparse
+import sys
+from datetime import datetime
+
+# ------------------------------------
+# Mongo indexes for the bot's collections.
+#
+# ensure_indexes(db) is called on startup and only creates what's missing,
+# so it's cheap to run every time. `python indexes.py --check` also runs
+# explain() on the hot queries and exits non-zero if any would scan a
+# whole collection.
+# ------------------------------------
+
+DAY = 24 * 60 * 60
+
+# collection -> [(keys, options)]
+REQUIRED = {
+    "users": [
+        ([("user_id", 1)], {"name": "user_id_unique", "unique": True}),
+    ],
+    "reminders": [
+        # Serves the due-reminders range scan; the TTL cleans up reminders
+        # that could never be delivered.
+        ([("time", 1)], {"name": "time_ttl", "expireAfterSeconds": 7 * DAY}),
+    ],
+    "feedbacks": [
+        # Feedback is kept for review, so no TTL; only serves reads by date.
+        ([("created_at", 1)], {"name": "created_at"}),
+    ],
+    "broadcasts": [
+        ([("done", 1), ("started_at", -1)], {"name": "done_recent"}),
+    ],
+    "autoclean": [
+        # Safety net: Telegram won't delete messages this old anyway.
+        ([("expires_at", 1)], {"name": "expires_at_ttl", "expireAfterSeconds": 2 * DAY}),
+    ],
+}
+
+# collection -> [index names to drop if an older deploy created them]
+RETIRED = {
+    "feedbacks": ["created_at_ttl"],  # expired feedback after 180 days
+}
+
+# (collection, filter, sort) for every query that runs per message or per tick.
+HOT_QUERIES = [
+    ("users", {"user_id": 0}, None),
+    ("users", {"_id": {"$gt": 0}}, [("_id", 1)]),
+    ("reminders", {"time": {"$lte": datetime(2000, 1, 1)}}, None),
+    ("broadcasts", {"done": False}, [("started_at", -1)]),
+]
+
+
+def _same(existing, keys, options):
+    if list(existing["key"]) != list(keys):
+        return False
+    for option in ("unique", "expireAfterSeconds"):
+        if existing.get(option) != options.get(option):
+            return False
+    return True
+
+
+def ensure_indexes(db, required=None, log=print):
+    # Returns {collection: [index names created or changed]}. Mongo errors
+    # are logged, not raised, so a bot still starts with Mongo down.
+    from pymongo.errors import ConnectionFailure, PyMongoError
+
+    changed = {}
+    for name, specs in (required or REQUIRED).items():
+        try:
+            _ensure_collection(db, name, specs, changed, log)
+        except ConnectionFailure as e:
+            log(f"[indexes] Mongo unreachable, skipping the index check: {e}")
+            break
+        except PyMongoError as e:
+            log(f"[indexes] {name} failed: {e}")
+    return changed
+
+
+def _ensure_collection(db, name, specs, changed, log):
+    collection = db[name]
+    existing = collection.index_information()
+    for index_name in RETIRED.get(name, ()):
+        if existing.pop(index_name, None) is not None:
+            collection.drop_index(index_name)
+            changed.setdefault(name, []).append(index_name)
+            log(f"[indexes] {name}.{index_name} dropped")
+    for keys, options in specs:
+        index_name = options["name"]
+        current = existing.get(index_name)
+        if current is not None and _same(current, keys, options):
+            continue
+        if current is not None:
+            if (
+                list(current["key"]) == list(keys)
+                and current.get("unique") == options.get("unique")
+                and "expireAfterSeconds" in current
+                and "expireAfterSeconds" in options
+            ):
+                # Only the TTL value differs: change it in place. Adding
+                # or removing a TTL needs a rebuild.
+                db.command("collMod", name, index={"name": index_name, "expireAfterSeconds": options["expireAfterSeconds"]})
+            else:
+                collection.drop_index(index_name)
+                collection.create_index(keys, **options)
+        else:
+            try:
+                collection.create_index(keys, **options)
+            except Exception as e:
+                # Most likely duplicate user_ids blocking the unique index.
+                log(f"[indexes] {name}.{index_name} failed: {e}")
+                continue
+        changed.setdefault(name, []).append(index_name)
+        log(f"[indexes] {name}.{index_name} ready")
+
+
+def _stages(plan):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _stages(plan[key])
+    for child in plan.get("inputStages", ()):
+        yield from _stages(child)
+    for shard in plan.get("shards", ()):
+        yield from _stages(shard.get("winningPlan", {}))
+
+
+def check_plans(db, queries=None):
+    # Returns [(collection, filter, stages)] for queries that hit COLLSCAN.
+    bad = []
+    for name, query, sort in queries or HOT_QUERIES:
+        cursor = db[name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain()["queryPlanner"]["winningPlan"]
+        stages = [s for s in _stages(plan) if s]
+        if "COLLSCAN" in stages:
+            bad.append((name, query, stages))
+    return bad
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create the bot's Mongo indexes")
+    parser.add_argument("--uri", help="defaults to MONGO_DB_URI")
+    parser.add_argument("--db", default="telegram_bot_db")
+    parser.add_argument("--check", action="store_true", help="explain() the hot queries and fail on COLLSCAN")
+    args = parser.parse_args()
+
+    from pymongo import MongoClient
+
+    if args.uri:
+        uri = args.uri
+    else:
+        from config import MONGO_DB_URI as uri
+
+    db = MongoClient(uri)[args.db]
+    ensure_indexes(db)
+    if args.check:
+        bad = check_plans(db)
+        for name, query, stages in bad:
+            print(f"COLLSCAN: {name}.find({query}) -> {' <- '.join(stages)}")
+        if bad:
+            sys.exit(1)
+        print(f"{len(HOT_QUERIES)} hot queries use an index")
+
+
+if __name__ == "__main__":
+    main()
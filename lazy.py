@@ -0,0 +1,113 @@
+import importlib
+import threading
+from os import getenv
+
+# ------------------------------------
+# Deferred imports and Mongo clients.
+#
+#   openai = lazy_import("openai")
+#   openai.api_key = "..."         # remembered, applied on first real use
+#   db = lazy_mongo(lambda: config.MONGO_DB_URI, "telegram_bot_db")
+#   users_collection = db["users"]  # no connection until the first query
+#
+# Keeps heavy packages and network clients off the startup path; they are
+# loaded by whichever handler needs them first.
+# ------------------------------------
+
+_lock = threading.RLock()
+
+
+class LazyModule:
+    def __init__(self, name, on_load=None):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_on_load", on_load)
+        object.__setattr__(self, "_module", None)
+        object.__setattr__(self, "_pending", {})
+
+    def _load(self):
+        module = self._module
+        if module is None:
+            with _lock:
+                module = self._module
+                if module is None:
+                    module = importlib.import_module(self._name)
+                    for key, value in self._pending.items():
+                        setattr(module, key, value)
+                    if self._on_load:
+                        self._on_load(module)
+                    object.__setattr__(self, "_module", module)
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        if self._module is None:
+            self._pending[attr] = value
+        else:
+            setattr(self._module, attr, value)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_import(name, on_load=None):
+    return LazyModule(name, on_load)
+
+
+def is_loaded(obj):
+    return not isinstance(obj, LazyModule) or obj._module is not None
+
+
+class LazyCollection:
+    def __init__(self, database, name):
+        self._database = database
+        self._name = name
+        self._collection = None
+
+    def _get(self):
+        if self._collection is None:
+            self._collection = self._database._get()[self._name]
+        return self._collection
+
+    def __getattr__(self, attr):
+        return getattr(self._get(), attr)
+
+    def __getitem__(self, name):
+        return self._get()[name]
+
+
+class LazyDatabase:
+    def __init__(self, uri, name, **client_kwargs):
+        # uri may be a callable so config is read at connect time, not import time.
+        self._uri = uri
+        self._name = name
+        self._client_kwargs = client_kwargs
+        self._database = None
+        self._collections = {}
+
+    def _get(self):
+        if self._database is None:
+            with _lock:
+                if self._database is None:
+                    from pymongo import MongoClient
+
+                    uri = self._uri() if callable(self._uri) else self._uri
+                    self._database = MongoClient(uri, **self._client_kwargs)[self._name]
+        return self._database
+
+    def __getitem__(self, name):
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = LazyCollection(self, name)
+        return collection
+
+    def __getattr__(self, attr):
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        return getattr(self._get(), attr)
+
+
+def lazy_mongo(uri=None, name="telegram_bot_db", **client_kwargs):
+    return LazyDatabase(uri or (lambda: getenv("MONGO_DB_URI")), name, **client_kwargs)
@@ -0,0 +1,90 @@
+import threading
+from collections import OrderedDict
+from os import getenv
+
+from breaker import CircuitBreaker
+from lazy import lazy_import
+from metrics import timed
+
+# ------------------------------------
+# Completion backend shared by the gpt bots.
+#
+# Calls go through a circuit breaker: while OpenAI is down or slow,
+# get_chatgpt_response fails fast with BreakerOpen instead of holding a
+# handler for the whole request. The last answers are kept, so a question
+# that was answered before is still answered while the breaker is open.
+# ------------------------------------
+
+OPENAI_MODEL = getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+LLM_TIMEOUT = float(getenv("LLM_TIMEOUT", "20"))
+LLM_PROBE_INTERVAL = float(getenv("LLM_PROBE_INTERVAL", "5"))
+ANSWER_CACHE_SIZE = int(getenv("ANSWER_CACHE_SIZE", "2000"))
+
+openai = lazy_import("openai")
+
+breaker = CircuitBreaker("openai")
+answers = OrderedDict()
+_answers_lock = threading.Lock()
+
+
+def set_api_key(key):
+    openai.api_key = key
+
+
+def complete(query, **kwargs):
+    response = openai.ChatCompletion.create(
+        model=OPENAI_MODEL,
+        messages=[
+            {"role": "user", "content": query}
+        ],
+        request_timeout=LLM_TIMEOUT,
+        **kwargs
+    )
+    return response.choices[0].message['content'].strip()
+
+
+# The call the breaker wraps; swapped for a fake by loadgen and the benchmarks.
+backend = complete
+
+
+def _key(query):
+    return " ".join(query.lower().split()).strip(" ?!.")
+
+
+def cached_answer(query):
+    with _answers_lock:
+        return answers.get(_key(query))
+
+
+def _remember(query, answer):
+    key = _key(query)
+    with _answers_lock:
+        answers[key] = answer
+        answers.move_to_end(key)
+        if len(answers) > ANSWER_CACHE_SIZE:
+            answers.popitem(last=False)
+
+
+@timed("openai", "external")
+def get_chatgpt_response(query):
+    # Raises BreakerOpen (immediately) or the backend's error if there's no
+    # cached answer to fall back to.
+    try:
+        answer = breaker.call(backend, query)
+    except Exception:
+        cached = cached_answer(query)
+        if cached is not None:
+            return cached
+        raise
+    _remember(query, answer)
+    return answer
+
+
+def probe():
+    backend("ping", max_tokens=1)
+
+
+async def watch_backend(interval=None):
+    # Start next to app.run(): app.loop.create_task(watch_backend())
+    await breaker.watch(probe, interval or LLM_PROBE_INTERVAL)
+
@@ -0,0 +1,455 @@
+import argparse
+import asyncio
+import importlib.util
+import inspect
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict, namedtuple
+
+from fakes import FakeClient, FakeDatabase, FakeMessage
+from lazy import LazyCollection, LazyDatabase
+
+# ------------------------------------
+# Load generator / traffic replay for the gpt bots.
+#
+#   python loadgen.py --rate 500 --duration 30
+#   python loadgen.py --rate 500 --duration 60 --record traffic.jsonl
+#   python loadgen.py --replay traffic.jsonl --speed 2
+#   python loadgen.py --latency 0.8 --errors 0.05 --workers 64 --json
+#
+# Imports the real bot module and pushes synthetic updates (private
+# messages, group mentions, group chatter, commands) through its registered
+# pyrogram handlers and filters, the way pyrogram's dispatcher does: one
+# shared updates queue drained by `workers` tasks. Telegram, Mongo and
+# OpenAI are replaced by FakeClient, FakeDatabase and FakeCompletion.
+#
+# Latency is measured from when an update was due to arrive until the
+# pipeline task its handler returned has finished, so a feeder that falls
+# behind still counts against the numbers. "dispatch" is how long the
+# update held a dispatcher worker.
+# ------------------------------------
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+Event = namedtuple("Event", "t kind user_id chat_id text")
+
+MIX = {"private": 0.55, "mention": 0.15, "group": 0.2, "command": 0.1}
+
+TEXTS = {
+    "private": [
+        "hello, how are you?",
+        "what is the capital of France?",
+        "explain how rainbows form",
+        "can you suggest a good book to read?",
+        "kya haal hai bhai",
+        "write a short poem about the sea",
+        "why is the sky blue?",
+    ],
+    "mention": [
+        "@{bot} what is the tallest mountain?",
+        "@{bot} how many planets are there?",
+        "hey assistant, tell me something interesting",
+        "assistant can you translate good morning to hindi",
+    ],
+    "group": [
+        "random chatter in the group",
+        "lol",
+        "who is coming tonight?",
+        "good morning everyone",
+        "check this out",
+    ],
+    "command": [
+        "/joke",
+        "/quote",
+        "/help",
+        "/about",
+        "/menu",
+        "/toggle_chatgpt",
+    ],
+}
+
+FIRST_USER = 1_000_000  # keeps synthetic users clear of OWNER_ID
+FIRST_GROUP = -1_001_000_000_000
+
+
+class FakeCompletion:
+    # Stands in for llm.complete: blocks like the sync OpenAI client.
+    def __init__(self, latency=0.5, jitter=0.5, errors=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.errors = errors
+        self.calls = 0
+        self.failures = 0
+        self._rnd = random.Random(seed)
+
+    def __call__(self, query, **kwargs):
+        self.calls += 1
+        delay = self.latency * self._rnd.lognormvariate(0, self.jitter) if self.jitter else self.latency
+        time.sleep(delay)
+        if self._rnd.random() < self.errors:
+            self.failures += 1
+            raise RuntimeError("fake completion backend error")
+        return f"stubbed answer to: {query[:40]}"
+
+
+def parse_mix(text):
+    mix = dict(MIX)
+    for part in filter(None, (text or "").split(",")):
+        kind, _, weight = part.partition("=")
+        if kind not in TEXTS:
+            raise ValueError(f"unknown update kind {kind!r}")
+        mix[kind] = float(weight)
+    return mix
+
+
+def generate(rate, duration, users=5000, groups=200, mix=None, seed=0):
+    # Poisson arrivals at `rate` updates/sec for `duration` seconds.
+    rnd = random.Random(seed)
+    mix = mix or MIX
+    kinds, weights = zip(*mix.items())
+    t = 0.0
+    while True:
+        t += rnd.expovariate(rate)
+        if t >= duration:
+            return
+        kind = rnd.choices(kinds, weights)[0]
+        user_id = FIRST_USER + rnd.randrange(users)
+        chat_id = user_id if kind in ("private", "command") else FIRST_GROUP - rnd.randrange(groups)
+        yield Event(round(t, 6), kind, user_id, chat_id, rnd.choice(TEXTS[kind]))
+
+
+def save(events, path):
+    with open(path, "w") as handle:
+        for event in events:
+            handle.write(json.dumps(event._asdict()) + "\n")
+
+
+def load(path):
+    with open(path) as handle:
+        return [Event(**json.loads(line)) for line in handle if line.strip()]
+
+
+def record(app, path, group=-100):
+    # Append every incoming text message to `path` in replay format, e.g.
+    # record(app, "traffic.jsonl") before app.run() on a staging bot.
+    from pyrogram import filters
+    from pyrogram.enums import ChatType
+
+    handle = open(path, "a", buffering=1)
+    started = time.monotonic()
+
+    @app.on_message(filters.text, group=group)
+    async def recorder(client, message):
+        private = message.chat.type in (ChatType.PRIVATE, ChatType.BOT)
+        if private:
+            kind = "command" if message.text.startswith("/") else "private"
+        else:
+            kind = "mention" if message.mentioned or "assistant" in message.text.lower() else "group"
+        user_id = message.from_user.id if message.from_user else message.chat.id
+        event = Event(round(time.monotonic() - started, 6), kind, user_id, message.chat.id, message.text)
+        handle.write(json.dumps(event._asdict()) + "\n")
+
+    return recorder
+
+
+def load_bot(path="gpt/testing.py", completion=None, db=None):
+    # Import the real bot module, then swap its Mongo collections and
+    # completion backend for in-memory fakes. The pyrogram Client is
+    # created but never started. The fake sits behind llm's circuit
+    # breaker and answer cache, so those are exercised too.
+    from pyrogram import Client
+
+    import llm
+
+    name = "loadgen_" + os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, path))
+    bot = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(bot)
+
+    db = db if db is not None else FakeDatabase()
+    for attr, value in list(vars(bot).items()):
+        if isinstance(value, LazyCollection):
+            setattr(bot, attr, db[value._name])
+        elif isinstance(value, LazyDatabase):
+            setattr(bot, attr, db)
+        elif isinstance(value, Client):
+            bot.app = value
+    bot.completion = completion if completion is not None else FakeCompletion(latency=0)
+    llm.backend = bot.completion
+    llm.breaker.reset()
+    llm.answers.clear()
+    bot.breaker = llm.breaker
+    if hasattr(bot, "chatgpt_enabled"):
+        bot.chatgpt_enabled = True
+    bot.db = db
+    return bot
+
+
+def to_message(client, event, bot_username):
+    text = event.text.replace("{bot}", bot_username)
+    return FakeMessage(
+        client,
+        text,
+        user_id=event.user_id,
+        chat_id=event.chat_id,
+        first_name=f"user{event.user_id % 10000}",
+        private=event.kind in ("private", "command"),
+        mentioned=f"@{bot_username}" in text,
+    )
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    values = sorted(values)
+
+    def at(q):
+        return values[min(len(values) - 1, int(q * len(values)))] * 1000
+
+    return {"p50": at(0.5), "p90": at(0.9), "p99": at(0.99), "max": values[-1] * 1000, "count": len(values)}
+
+
+class Harness:
+    def __init__(self, bot, client=None, workers=None, sample_every=0.05):
+        self.bot = bot
+        self.client = client or FakeClient()
+        self.workers = workers or bot.app.workers
+        self.sample_every = sample_every
+        self.queue = None
+        self.latencies = defaultdict(list)
+        self.dispatch_latencies = []  # how long each update held a worker
+        self._finishing = set()
+        self.errors = Counter()
+        self.samples = []
+        self.handled = 0
+        self.pipelines = [v for v in vars(bot).values() if type(v).__name__ == "Pipeline"]
+        self.outbox = getattr(bot, "outbox", None)
+
+    async def dispatch(self, message):
+        # Same walk as pyrogram's Dispatcher.handler_worker: first matching
+        # handler in each group, StopPropagation ends the update. Returns the
+        # pipeline tasks the handlers handed the update to.
+        from pyrogram import ContinuePropagation, StopPropagation
+        from pyrogram.handlers import MessageHandler
+
+        tasks = []
+        for group in list(self.bot.app.dispatcher.groups.values()):
+            for handler in group:
+                if not isinstance(handler, MessageHandler):
+                    continue
+                try:
+                    if not await handler.check(self.client, message):
+                        continue
+                except Exception as e:
+                    self.errors[f"filter:{type(e).__name__}"] += 1
+                    continue
+                try:
+                    if inspect.iscoroutinefunction(handler.callback):
+                        result = await handler.callback(self.client, message)
+                    else:
+                        result = await asyncio.get_running_loop().run_in_executor(None, handler.callback, self.client, message)
+                    if isinstance(result, asyncio.Future):
+                        tasks.append(result)
+                except StopPropagation:
+                    return tasks
+                except ContinuePropagation:
+                    continue
+                except Exception as e:
+                    self.errors[f"{handler.callback.__name__}:{type(e).__name__}"] += 1
+                break
+        return tasks
+
+    async def _worker(self):
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            event, message, due = item
+            tasks = await self.dispatch(message)
+            self.dispatch_latencies.append(time.perf_counter() - due)
+            if tasks:
+                finish = asyncio.get_running_loop().create_task(self._finish(event, due, tasks))
+                self._finishing.add(finish)
+                finish.add_done_callback(self._finishing.discard)
+            else:
+                self._done(event, due)
+
+    async def _finish(self, event, due, tasks):
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._done(event, due)
+
+    def _done(self, event, due):
+        self.latencies[event.kind].append(time.perf_counter() - due)
+        self.handled += 1
+
+    async def _feed(self, events, speed, username):
+        start = time.perf_counter()
+        for event in events:
+            due = start + event.t / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.queue.put_nowait((event, to_message(self.client, event, username), due))
+
+    def backlog(self):
+        stages = Counter()
+        for pipeline in self.pipelines:
+            for stage, waiting in pipeline.backlog().items():
+                stages[f"{pipeline.name}.{stage}"] += waiting
+        return {
+            "updates_queue": self.queue.qsize(),
+            "inflight": sum(p.inflight() for p in self.pipelines),
+            "background": sum(p.pending() for p in self.pipelines),
+            "outbox": self.outbox.depth() if self.outbox is not None else 0,
+            **stages,
+        }
+
+    async def _sample(self):
+        while True:
+            self.samples.append(self.backlog())
+            await asyncio.sleep(self.sample_every)
+
+    async def run(self, events, speed=1.0):
+        events = list(events)
+        self.queue = asyncio.Queue()
+        # Let pyrogram's add_handler tasks (queued at import) register.
+        for _ in range(3):
+            await asyncio.sleep(0)
+        username = self.client.me.username
+        loop = asyncio.get_running_loop()
+        workers = [loop.create_task(self._worker()) for _ in range(self.workers)]
+        sampler = loop.create_task(self._sample())
+        # The bots start these next to app.run().
+        watch_backend = getattr(self.bot, "watch_backend", None)
+        watcher = loop.create_task(watch_backend()) if watch_backend else None
+        if self.outbox is not None:
+            self.outbox.client = self.client
+            await self.outbox.start()
+
+        start = time.perf_counter()
+        await self._feed(events, speed, username)
+        fed = time.perf_counter() - start
+        for _ in workers:
+            self.queue.put_nowait(None)
+        await asyncio.gather(*workers)
+        while self._finishing:
+            await asyncio.gather(*self._finishing)
+        took = time.perf_counter() - start
+        while any(p.pending() for p in self.pipelines):
+            await asyncio.sleep(0.01)
+        sampler.cancel()
+        if watcher:
+            watcher.cancel()
+        if self.outbox is not None:
+            # Whatever is still queued shows up as the final outbox backlog.
+            await self.outbox.stop(drain=False)
+        return self.report(events, speed, fed, took)
+
+    def report(self, events, speed, fed, took):
+        span = events[-1].t / speed if events else 0.0
+        everything = [v for values in self.latencies.values() for v in values]
+        backlog = {}
+        for key in {k for sample in self.samples for k in sample}:
+            values = [sample.get(key, 0) for sample in self.samples]
+            backlog[key] = {"max": max(values), "mean": statistics.fmean(values), "final": values[-1]}
+        completion = getattr(self.bot, "completion", None)
+        return {
+            "updates": len(events),
+            "handled": self.handled,
+            "workers": self.workers,
+            "offered_rate": len(events) / span if span else 0.0,
+            "feed_seconds": fed,
+            "seconds": took,
+            "throughput": self.handled / took if took else 0.0,
+            "latency_ms": {"all": percentiles(everything), **{k: percentiles(v) for k, v in sorted(self.latencies.items())}},
+            "dispatch_ms": percentiles(self.dispatch_latencies),
+            "backlog": dict(sorted(backlog.items())),
+            "replies": len(self.client.sent),
+            "completions": getattr(completion, "calls", None),
+            "completion_failures": getattr(completion, "failures", None),
+            "breaker": self.bot.breaker.report(),
+            "outbox": self.outbox.report() if self.outbox is not None else None,
+            "errors": dict(self.errors),
+        }
+
+
+def format_report(report):
+    lines = [
+        f"{report['handled']}/{report['updates']} updates in {report['seconds']:.1f}s "
+        f"with {report['workers']} workers",
+        f"offered {report['offered_rate']:.1f}/s, handled {report['throughput']:.1f}/s",
+        f"replies {report['replies']}, completions {report['completions']} ({report['completion_failures']} failed)",
+        "",
+        f"{'latency (ms)':<14}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}{'count':>8}",
+    ]
+    for kind, p in report["latency_ms"].items():
+        if p:
+            lines.append(f"{kind:<14}{p['p50']:9.1f}{p['p90']:9.1f}{p['p99']:9.1f}{p['max']:9.1f}{p['count']:8d}")
+    p = report["dispatch_ms"]
+    if p:
+        lines.append(f"{'dispatch':<14}{p['p50']:9.1f}{p['p90']:9.1f}{p['p99']:9.1f}{p['max']:9.1f}{p['count']:8d}")
+    lines += ["", f"{'backlog':<24}{'max':>8}{'mean':>10}{'final':>8}"]
+    for name, b in report["backlog"].items():
+        lines.append(f"{name:<24}{b['max']:8d}{b['mean']:10.1f}{b['final']:8d}")
+    o = report["outbox"]
+    if o is not None:
+        lines += [
+            "",
+            f"outbox: sent {o.get('sent', 0)}, still queued {o['depth']}, "
+            f"floodwaits {o.get('flood_waits', 0)}, failed {o.get('failed', 0)}",
+        ]
+    b = report["breaker"]
+    lines += [
+        "",
+        f"breaker {b['state']}: trips {b.get('trips', 0)}, rejected {b.get('rejected', 0)}, "
+        f"probes {b.get('probes', 0)}, recoveries {b.get('recoveries', 0)}",
+    ]
+    if report["errors"]:
+        lines += ["", "errors: " + ", ".join(f"{k} x{v}" for k, v in report["errors"].items())]
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay or generate synthetic traffic against a gpt bot")
+    parser.add_argument("--bot", default="gpt/testing.py")
+    parser.add_argument("--rate", type=float, default=500, help="updates/sec to generate")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of traffic to generate")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--groups", type=int, default=200)
+    parser.add_argument("--mix", help="e.g. private=0.5,mention=0.2,group=0.2,command=0.1")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--record", metavar="PATH", help="save the generated stream for replay")
+    parser.add_argument("--replay", metavar="PATH", help="replay a recorded stream instead of generating")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier")
+    parser.add_argument("--latency", type=float, default=0.5, help="mean completion latency (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.5, help="lognormal sigma of completion latency")
+    parser.add_argument("--errors", type=float, default=0.0, help="completion error rate")
+    parser.add_argument("--workers", type=int, help="dispatcher workers (default: the bot's Client.workers)")
+    parser.add_argument("--outbox-rate", type=float, help="outbox messages/sec (default: OUTBOX_RATE)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--verbose", action="store_true", help="show the bot's log output")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL)
+
+    if args.replay:
+        events = load(args.replay)
+    else:
+        events = list(generate(args.rate, args.duration, args.users, args.groups, parse_mix(args.mix), args.seed))
+        if args.record:
+            save(events, args.record)
+
+    bot = load_bot(args.bot, FakeCompletion(args.latency, args.jitter, args.errors, args.seed))
+    if args.outbox_rate and getattr(bot, "outbox", None) is not None:
+        bot.outbox.rate = args.outbox_rate
+    harness = Harness(bot, workers=args.workers)
+    report = bot.app.loop.run_until_complete(harness.run(events, args.speed))
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
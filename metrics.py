@@ -0,0 +1,222 @@
+import asyncio
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from os import getenv
+
+# ------------------------------------
+# Latency histograms, error counters and in-flight gauges.
+#
+#   @timed("get_thumb")                       # sync or async functions
+#   with track("mongo.update_user", "external"): ...
+#
+# serve() exposes everything in Prometheus text format on METRICS_PORT and
+# register_stats(app) adds an owner-only /stats summary.
+# ------------------------------------
+
+METRICS_PORT = int(getenv("METRICS_PORT", "9090"))
+METRICS_HOST = getenv("METRICS_HOST", "127.0.0.1")
+
+MESSAGE_LIMIT = 4096  # Telegram's limit on a message's text
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.errors = 0
+        self.inflight = 0
+        # @timed functions also run on executor threads.
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        bucket = bisect.bisect_left(BUCKETS, seconds)
+        with self._lock:
+            self.counts[bucket] += 1
+            self.total += seconds
+            self.count += 1
+
+    def enter(self):
+        with self._lock:
+            self.inflight += 1
+
+    def exit(self, seconds, error=False):
+        bucket = bisect.bisect_left(BUCKETS, seconds)
+        with self._lock:
+            self.inflight -= 1
+            self.errors += error
+            self.counts[bucket] += 1
+            self.total += seconds
+            self.count += 1
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation.
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS + (float("inf"),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+_lock = threading.Lock()
+registry = {}  # (kind, name) -> Histogram
+gauges = {}  # name -> zero-arg callable, read at scrape time
+
+
+def get(name, kind="handler"):
+    key = (kind, name)
+    hist = registry.get(key)
+    if hist is None:
+        with _lock:
+            hist = registry.setdefault(key, Histogram())
+    return hist
+
+
+@contextmanager
+def track(name, kind="external"):
+    hist = get(name, kind)
+    hist.enter()
+    start = time.perf_counter()
+    error = False
+    try:
+        yield hist
+    except StopAsyncIteration:
+        # pyrogram's Stop/ContinuePropagation; like CancelledError (a
+        # BaseException), control flow rather than a failure.
+        raise
+    except Exception:
+        error = True
+        raise
+    finally:
+        hist.exit(time.perf_counter() - start, error)
+
+
+def timed(name=None, kind="handler"):
+    def decorator(func):
+        label = name or func.__name__
+
+        if asyncio.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with track(label, kind):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with track(label, kind):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def gauge(name, func):
+    gauges[name] = func
+
+
+def _read_gauges():
+    values = {}
+    for name, func in sorted(gauges.items()):
+        try:
+            values[name] = float(func())
+        except Exception:
+            continue
+    return values
+
+
+def render():
+    lines = [
+        "# TYPE bot_latency_seconds histogram",
+    ]
+    items = sorted(registry.items())
+    for (kind, name), hist in items:
+        labels = f'kind="{kind}",name="{name}"'
+        cumulative = 0
+        for bound, n in zip(BUCKETS, hist.counts):
+            cumulative += n
+            lines.append(f'bot_latency_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'bot_latency_seconds_bucket{{{labels},le="+Inf"}} {hist.count}')
+        lines.append(f"bot_latency_seconds_sum{{{labels}}} {hist.total:.6f}")
+        lines.append(f"bot_latency_seconds_count{{{labels}}} {hist.count}")
+    lines.append("# TYPE bot_errors_total counter")
+    for (kind, name), hist in items:
+        lines.append(f'bot_errors_total{{kind="{kind}",name="{name}"}} {hist.errors}')
+    lines.append("# TYPE bot_inflight gauge")
+    for (kind, name), hist in items:
+        lines.append(f'bot_inflight{{kind="{kind}",name="{name}"}} {hist.inflight}')
+    lines.append("# TYPE bot_gauge gauge")
+    for name, value in _read_gauges().items():
+        lines.append(f'bot_gauge{{name="{name}"}} {value:g}')
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=None, host=None):
+    server = ThreadingHTTPServer((host or METRICS_HOST, port or METRICS_PORT), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+def summary():
+    if not registry and not gauges:
+        return "No metrics recorded yet."
+    lines = ["name | calls | errors | inflight | avg | p50 | p99"]
+    for (kind, name), hist in sorted(registry.items()):
+        avg = hist.total / hist.count if hist.count else 0
+        lines.append(
+            f"[{kind}] {name} | {hist.count} | {hist.errors} | {hist.inflight} | "
+            f"{avg * 1000:.0f}ms | <{hist.quantile(0.5) * 1000:.0f}ms | <{hist.quantile(0.99) * 1000:.0f}ms"
+        )
+    for name, value in _read_gauges().items():
+        lines.append(f"{name} = {value:g}")
+    return "\n".join(lines)
+
+
+def register_stats(app):
+    from pyrogram import filters
+
+    from config import OWNER_ID
+
+    # group=-1 runs before the bots' catch-all text handlers.
+    @app.on_message(filters.command("stats") & filters.user(OWNER_ID), group=-1)
+    async def stats_command(client, message):
+        text = summary()
+        if len(text) <= MESSAGE_LIMIT:
+            await message.reply_text(f"<code>{text}</code>")
+        else:
+            document = BytesIO(text.encode())
+            document.name = "stats.txt"
+            await message.reply_document(document, caption=f"{len(registry)} histograms, {len(gauges)} gauges")
+        message.stop_propagation()
+
+    return stats_command
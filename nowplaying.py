@@ -0,0 +1,100 @@
+import io
+import os
+
+from admission import parse_duration
+from thumbnailchek import (
+    BAR_END,
+    BAR_START,
+    KNOB_RADIUS,
+    PROGRESS_BOX,
+    Image,
+    compose_base,
+    download_thumb,
+    draw_progress,
+    fetch_meta,
+)
+
+# ------------------------------------
+# Now-playing card with a live progress bar.
+#
+#   card = await NowPlaying.create(videoid)
+#   path = card.save(elapsed_seconds)
+#
+# The blurred, titled base card is composed once. A progress update only
+# redraws the strip at the bottom (PROGRESS_BOX) on top of a saved copy of
+# that strip, and skips the work entirely if nothing visible changed.
+# ------------------------------------
+
+
+def format_time(seconds):
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
+
+
+def knob_position(elapsed, total):
+    if not total:
+        return BAR_START
+    fraction = min(max(elapsed / total, 0), 1)
+    return int(BAR_START + fraction * (BAR_END - BAR_START - 2 * KNOB_RADIUS))
+
+
+class NowPlaying:
+    def __init__(self, videoid, base, duration):
+        self.videoid = videoid
+        self.duration = duration
+        self.total = parse_duration(duration)
+        self.card = base
+        # Clean copy of the progress strip, before anything was drawn on it.
+        self.strip = base.crop(PROGRESS_BOX)
+        self.shown = None
+        self.renders = 0
+
+    @classmethod
+    async def create(cls, videoid):
+        meta = await fetch_meta(videoid)
+        path = await download_thumb(videoid, meta["thumbnail"])
+        try:
+            base = compose_base(Image.open(path), meta)
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return cls(videoid, base, meta["duration"])
+
+    def render(self, elapsed):
+        # Returns True if the card changed.
+        label = format_time(elapsed)
+        knob = knob_position(elapsed, self.total)
+        if self.shown == (label, knob):
+            return False
+        strip = self.strip.copy()
+        draw_progress(strip, label, self.duration, knob_x=knob, origin=PROGRESS_BOX[:2])
+        self.card.paste(strip, PROGRESS_BOX[:2])
+        self.shown = (label, knob)
+        self.renders += 1
+        return True
+
+    def _encode(self, target, format):
+        image = self.card.convert("RGB") if format == "JPEG" else self.card
+        image.save(target, format=format, quality=85)
+
+    # PNG encoding a 1280x720 card costs far more than the redraw itself, so
+    # live updates default to JPEG.
+    def save(self, elapsed, path=None, format="JPEG"):
+        self.render(elapsed)
+        path = path or f"cache/{self.videoid}_np.{format.lower()}"
+        self._encode(path, format)
+        return path
+
+    def to_bytes(self, elapsed, format="JPEG"):
+        self.render(elapsed)
+        buffer = io.BytesIO()
+        buffer.name = f"{self.videoid}.{format.lower()}"
+        self._encode(buffer, format)
+        buffer.seek(0)
+        return buffer
@@ -0,0 +1,266 @@
+import asyncio
+import heapq
+import inspect
+import itertools
+import logging
+import time
+from collections import Counter, deque
+from os import getenv
+
+import metrics
+
+try:
+    from pyrogram.errors import FloodWait
+except ImportError:
+    FloodWait = None
+
+# ------------------------------------
+# Outbound message scheduler.
+#
+#   outbox = Outbox(app)
+#   await outbox.start()
+#   await outbox.send(chat_id, "hello")           # waits for delivery
+#   outbox.reply(message, "hi")                   # fire and forget
+#   outbox.edit(chat_id, message_id, "progress")  # rapid edits coalesce
+#
+# Messages to one chat go out in order, one at a time; different chats are
+# independent. A FloodWait only pauses the chat that caused it. Handlers
+# shouldn't await replies: a FloodWait would hold them (and their pipeline
+# slot) for its whole duration. Failed deliveries are logged either way.
+# ------------------------------------
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_RATE = float(getenv("OUTBOX_RATE", "25"))  # messages/sec, all chats
+OUTBOX_PRIVATE_INTERVAL = float(getenv("OUTBOX_PRIVATE_INTERVAL", "1"))
+OUTBOX_GROUP_INTERVAL = float(getenv("OUTBOX_GROUP_INTERVAL", "3"))
+OUTBOX_MAX_RETRIES = int(getenv("OUTBOX_MAX_RETRIES", "5"))
+
+
+def flood_wait_seconds(error):
+    if FloodWait is not None and isinstance(error, FloodWait):
+        return float(error.value)
+    if type(error).__name__ == "FloodWait":
+        return float(getattr(error, "value", getattr(error, "x", 1)))
+    return None
+
+
+def _consume(future):
+    if not future.cancelled():
+        future.exception()
+
+
+def _chain(source, target):
+    # Settle `target` the way `source` was settled.
+    if target.done():
+        return
+    if source.cancelled():
+        target.cancel()
+    elif source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+class Job:
+    __slots__ = ("method", "args", "kwargs", "future", "key", "retries")
+
+    def __init__(self, method, args, kwargs, future, key=None):
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.future = future
+        self.key = key
+        self.retries = 0
+
+
+class Outbox:
+    def __init__(self, client, rate=None, private_interval=None, group_interval=None):
+        self.client = client
+        self.rate = rate or OUTBOX_RATE
+        self.private_interval = OUTBOX_PRIVATE_INTERVAL if private_interval is None else private_interval
+        self.group_interval = OUTBOX_GROUP_INTERVAL if group_interval is None else group_interval
+        self.queues = {}
+        self.edits = {}
+        self.next_time = {}
+        self.busy = set()
+        self.ready = []
+        self.stats = Counter()
+        self._seq = itertools.count()
+        self._tokens = self.rate
+        self._refilled = time.monotonic()
+        self._wake = None
+        self._task = None
+        self._loop = None
+
+    # ------------------------------------
+    # Public API
+    # ------------------------------------
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = self._loop.create_task(self._dispatch())
+        metrics.gauge("outbox.depth", self.depth)
+        metrics.gauge("outbox.chats_waiting", lambda: sum(1 for q in self.queues.values() if q))
+        metrics.gauge("outbox.flood_waits", lambda: self.stats["flood_waits"])
+
+    async def stop(self, drain=True):
+        if drain:
+            while self.depth() or self.busy:
+                await asyncio.sleep(0.05)
+        if self._task:
+            self._task.cancel()
+
+    def send(self, chat_id, text, **kwargs):
+        return self._put(chat_id, Job("send_message", (chat_id, text), kwargs, self._future()))
+
+    def call(self, chat_id, method, *args, **kwargs):
+        # Any other client method that sends to a chat (send_photo, ...).
+        return self._put(chat_id, Job(method, args, kwargs, self._future()))
+
+    def edit(self, chat_id, message_id, text, **kwargs):
+        key = (chat_id, message_id)
+        pending = self.edits.get(key)
+        if pending is not None:
+            # Not sent yet: just replace the text, the older one is obsolete.
+            pending.args = (chat_id, message_id, text)
+            pending.kwargs = kwargs
+            self.stats["coalesced"] += 1
+            return pending.future
+        job = Job("edit_message_text", (chat_id, message_id, text), kwargs, self._future(), key)
+        self.edits[key] = job
+        return self._put(chat_id, job)
+
+    def reply(self, message, text, quote=None, **kwargs):
+        # Like Message.reply: quotes the message in groups, not in private.
+        if quote is None:
+            quote = message.chat.id < 0
+        if quote:
+            kwargs.setdefault("reply_to_message_id", message.id)
+        return self.send(message.chat.id, text, **kwargs)
+
+    def send_threadsafe(self, chat_id, text, **kwargs):
+        # For the sync handlers running in pyrogram's thread pool.
+        self._loop.call_soon_threadsafe(lambda: self.send(chat_id, text, **kwargs))
+
+    def depth(self, chat_id=None):
+        if chat_id is not None:
+            return len(self.queues.get(chat_id, ()))
+        return sum(len(q) for q in self.queues.values())
+
+    def report(self):
+        deepest = sorted(((len(q), c) for c, q in self.queues.items() if q), reverse=True)[:5]
+        return {
+            "depth": self.depth(),
+            "chats_waiting": sum(1 for q in self.queues.values() if q),
+            "in_flight": len(self.busy),
+            "deepest": [{"chat_id": c, "depth": n} for n, c in deepest],
+            **self.stats,
+        }
+
+    # ------------------------------------
+    # Scheduling
+    # ------------------------------------
+    def _future(self):
+        future = (self._loop or asyncio.get_running_loop()).create_future()
+        # Nobody awaits fire-and-forget replies; _deliver logs their failures.
+        future.add_done_callback(_consume)
+        return future
+
+    def _interval(self, chat_id):
+        return self.group_interval if chat_id < 0 else self.private_interval
+
+    def _put(self, chat_id, job):
+        queue = self.queues.get(chat_id)
+        if queue is None:
+            queue = self.queues[chat_id] = deque()
+        queue.append(job)
+        self.stats["queued"] += 1
+        if len(queue) == 1 and chat_id not in self.busy:
+            self._schedule(chat_id, self.next_time.get(chat_id, 0))
+        return job.future
+
+    def _schedule(self, chat_id, when):
+        heapq.heappush(self.ready, (when, next(self._seq), chat_id))
+        if self._wake is not None:
+            self._wake.set()
+
+    def _take_token(self, now):
+        self._tokens = min(self.rate, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / self.rate
+
+    async def _dispatch(self):
+        while True:
+            now = time.monotonic()
+            if not self.ready:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            when, _, chat_id = self.ready[0]
+            if when > now:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), when - now)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            if chat_id in self.busy or not self.queues.get(chat_id):
+                heapq.heappop(self.ready)
+                continue
+            wait = self._take_token(now)
+            if wait:
+                await asyncio.sleep(wait)
+                continue
+            heapq.heappop(self.ready)
+            self.busy.add(chat_id)
+            self._loop.create_task(self._deliver(chat_id))
+
+    async def _deliver(self, chat_id):
+        queue = self.queues[chat_id]
+        job = queue.popleft()
+        if job.key is not None:
+            self.edits.pop(job.key, None)
+        delay = self._interval(chat_id)
+        try:
+            result = getattr(self.client, job.method)(*job.args, **job.kwargs)
+            if inspect.isawaitable(result):
+                result = await result
+        except Exception as e:
+            wait = flood_wait_seconds(e)
+            if wait is not None and job.retries < OUTBOX_MAX_RETRIES:
+                job.retries += 1
+                delay = wait
+                self.stats["flood_waits"] += 1
+                newer = self.edits.get(job.key) if job.key is not None else None
+                if newer is not None:
+                    # edit() queued a newer text while this one was in flight;
+                    # this one is obsolete, so it settles with the newer one.
+                    newer.future.add_done_callback(lambda f, old=job.future: _chain(f, old))
+                    self.stats["coalesced"] += 1
+                else:
+                    if job.key is not None:
+                        self.edits[job.key] = job  # so later edits coalesce into it
+                    queue.appendleft(job)
+            else:
+                self.stats["failed"] += 1
+                logger.error(f"Outbox {job.method} to {chat_id} failed: {e}")
+                if not job.future.done():
+                    job.future.set_exception(e)
+        else:
+            self.stats["sent"] += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self.busy.discard(chat_id)
+            self.next_time[chat_id] = time.monotonic() + delay
+            if queue:
+                self._schedule(chat_id, self.next_time[chat_id])
+            else:
+                del self.queues[chat_id]
+                if len(self.next_time) > 10000:
+                    now = time.monotonic()
+                    self.next_time = {c: t for c, t in self.next_time.items() if t > now}
@@ -0,0 +1,206 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from os import getenv
+
+import metrics
+
+# ------------------------------------
+# Async handler pipeline for the gpt bots.
+#
+#   chat = Pipeline("private")
+#   chat.add("parse", parse)
+#   chat.add("rate_limit", rate_limit(limiter))
+#   chat.add("persist", persist, limit=PERSIST_LIMIT, blocking=True, background=True)
+#   chat.add("detect", detect_language, limit=DETECT_LIMIT, blocking=True)
+#   chat.add("respond", respond, limit=RESPOND_LIMIT)
+#
+#   @app.on_message(filters.private & filters.text)
+#   async def handle_private_message(client, message):
+#       return await chat.submit(client, message)
+#
+# submit() admits the update and returns its task right away, so a
+# pyrogram worker is only held while the pipeline is full (more than
+# PIPELINE_MAX_INFLIGHT updates in flight); that wait is the backpressure.
+# Each stage has its own concurrency limit, so slow OpenAI calls can only
+# hold RESPOND_LIMIT slots and never starve language detection or Mongo.
+# Blocking stages (langdetect, pymongo, the sync OpenAI client) run on the
+# pipeline's own thread pool instead of pyrogram's handful of workers.
+# A stage returns STOP to end processing of an update.
+# ------------------------------------
+
+DETECT_LIMIT = int(getenv("PIPELINE_DETECT_LIMIT", "4"))
+RESPOND_LIMIT = int(getenv("PIPELINE_RESPOND_LIMIT", "32"))
+PERSIST_LIMIT = int(getenv("PIPELINE_PERSIST_LIMIT", "8"))
+MAX_INFLIGHT = int(getenv("PIPELINE_MAX_INFLIGHT", "256"))  # admitted updates per pipeline
+USER_RATE = int(getenv("USER_RATE", "5"))  # messages ...
+USER_RATE_PERIOD = float(getenv("USER_RATE_PERIOD", "10"))  # ... per this many seconds
+
+STOP = object()
+
+
+class Context:
+    def __init__(self, client, message, pipeline=None):
+        self.client = client
+        self.pipeline = pipeline
+        self.message = message
+        self.text = (message.text or "").strip()
+        user = message.from_user
+        self.user = user
+        self.user_id = user.id if user else None
+        self.username = (user.first_name if user else None) or "Friend"
+        self.language = None
+        self.started = time.perf_counter()
+
+
+class Stage:
+    def __init__(self, name, func, limit=None, blocking=False, background=False):
+        self.name = name
+        self.func = func
+        self.limit = limit
+        self.blocking = blocking
+        self.background = background
+        self.semaphore = None
+        self.waiting = 0  # updates queued for a free slot
+
+
+class Pipeline:
+    def __init__(self, name, executor=None, max_inflight=None):
+        self.name = name
+        self.stages = []
+        self.executor = executor
+        self.max_inflight = max_inflight or MAX_INFLIGHT
+        self.admitting = 0  # handlers waiting for the pipeline to have room
+        self._admission = None
+        self._running = set()  # admitted updates
+        self._tasks = set()  # background stages
+
+    def add(self, name, func, limit=None, blocking=False, background=False):
+        self.stages.append(Stage(name, func, limit, blocking, background))
+        return func
+
+    def _pool(self):
+        if self.executor is None:
+            workers = sum(s.limit or 1 for s in self.stages if s.blocking) + RESPOND_LIMIT
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{self.name}-pipeline")
+        return self.executor
+
+    async def offload(self, func, *args):
+        # Run a blocking call (e.g. the OpenAI client) from an async stage.
+        return await asyncio.get_running_loop().run_in_executor(self._pool(), func, *args)
+
+    async def _call(self, stage, ctx):
+        if stage.limit and stage.semaphore is None:
+            stage.semaphore = asyncio.Semaphore(stage.limit)
+        with metrics.track(f"{self.name}.{stage.name}", "stage"):
+            if stage.semaphore is not None:
+                stage.waiting += 1
+                try:
+                    await stage.semaphore.acquire()
+                finally:
+                    stage.waiting -= 1
+            try:
+                if stage.blocking:
+                    return await self.offload(stage.func, ctx)
+                return await stage.func(ctx)
+            finally:
+                if stage.semaphore is not None:
+                    stage.semaphore.release()
+
+    async def _background(self, stage, ctx):
+        try:
+            await self._call(stage, ctx)
+        except Exception as e:
+            print(f"[{self.name}] {stage.name} failed: {e}")
+
+    async def run(self, client, message):
+        # Process one update to the end. Handlers should use submit().
+        ctx = Context(client, message, self)
+        for stage in self.stages:
+            if stage.background:
+                task = asyncio.get_running_loop().create_task(self._background(stage, ctx))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+                continue
+            if await self._call(stage, ctx) is STOP:
+                break
+        return ctx
+
+    async def _process(self, client, message):
+        try:
+            with metrics.track(self.name, "pipeline"):
+                return await self.run(client, message)
+        except Exception as e:
+            print(f"[{self.name}] update failed: {e}")
+        finally:
+            self._admission.release()
+
+    async def submit(self, client, message):
+        # Admit an update and return its task without waiting for it.
+        if self._admission is None:
+            self._admission = asyncio.Semaphore(self.max_inflight)
+        self.admitting += 1
+        try:
+            await self._admission.acquire()
+        finally:
+            self.admitting -= 1
+        task = asyncio.get_running_loop().create_task(self._process(client, message))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+        return task
+
+    def inflight(self):
+        # Admitted updates not finished yet.
+        return len(self._running)
+
+    def pending(self):
+        # Background stages still running (persist writes).
+        return len(self._tasks)
+
+    def backlog(self):
+        # Updates waiting for admission and for a stage slot, per stage.
+        return {
+            "admission": self.admitting,
+            **{stage.name: stage.waiting for stage in self.stages if stage.limit},
+        }
+
+
+class RateLimiter:
+    # Token bucket per user: `rate` messages per `period` seconds.
+    def __init__(self, rate=None, period=None):
+        self.rate = rate or USER_RATE
+        self.period = period or USER_RATE_PERIOD
+        self.buckets = {}
+
+    def allow(self, key, now=None):
+        now = now or time.monotonic()
+        tokens, last = self.buckets.get(key, (self.rate, now))
+        tokens = min(self.rate, tokens + (now - last) * self.rate / self.period)
+        if tokens < 1:
+            self.buckets[key] = (tokens, now)
+            return False
+        self.buckets[key] = (tokens - 1, now)
+        if len(self.buckets) > 50000:
+            self._prune(now)
+        return True
+
+    def _prune(self, now):
+        # Drop users whose bucket has refilled completely.
+        self.buckets = {k: v for k, v in self.buckets.items() if now - v[1] < self.period}
+
+
+def rate_limit(limiter):
+    async def stage(ctx):
+        if ctx.user_id is not None and not limiter.allow(ctx.user_id):
+            return STOP
+
+    return stage
+
+
+async def bot_user(client):
+    # pyrogram fills client.me on start; avoid a get_me() round trip per message.
+    return getattr(client, "me", None) or await client.get_me()
+
+
+async def bot_username(client):
+    return (await bot_user(client)).username
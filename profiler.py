@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from os import getenv
+
+# ------------------------------------
+# On-demand sampling profiler.
+#
+# /profile [seconds] (owner / EVAL users only) samples every thread's stack
+# for a while, measures event-loop lag at the same time and sends a
+# collapsed-stack file (flamegraph.pl / speedscope format) to LOGGER_ID.
+# Nothing runs until the command is used.
+# ------------------------------------
+
+logger = logging.getLogger(__name__)
+
+PROFILE_INTERVAL = float(getenv("PROFILE_INTERVAL", "0.005"))
+PROFILE_MAX_SECONDS = int(getenv("PROFILE_MAX_SECONDS", "300"))
+PROFILE_DIR = getenv("PROFILE_DIR", "cache")
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class Sampler:
+    def __init__(self, interval=None):
+        self.interval = interval or PROFILE_INTERVAL
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def collapsed(self):
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+
+class LoopLagMonitor:
+    # Schedules a sleep and measures how late the loop wakes it up.
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.lags = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - start - self.interval))
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    def summary(self):
+        if not self.lags:
+            return "no samples"
+        lags = sorted(self.lags)
+        p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))]
+        return (
+            f"avg {sum(lags) / len(lags) * 1000:.1f}ms, "
+            f"p99 {p99 * 1000:.1f}ms, max {lags[-1] * 1000:.1f}ms"
+        )
+
+
+_running = threading.Lock()
+
+
+async def profile(seconds, interval=None):
+    # Returns (path to the collapsed-stack file, sample count, loop lag summary).
+    if not _running.acquire(blocking=False):
+        raise RuntimeError("A profile is already running.")
+    try:
+        sampler = Sampler(interval)
+        monitor = LoopLagMonitor()
+        sampler.start()
+        monitor.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            monitor.stop()
+            await asyncio.get_running_loop().run_in_executor(None, sampler.stop)
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"profile_{int(time.time())}.folded")
+        with open(path, "w") as f:
+            f.write(sampler.collapsed())
+        return path, sampler.samples, monitor.summary()
+    finally:
+        _running.release()
+
+
+def register_profiler(app):
+    from pyrogram import filters
+
+    from config import EVAL, LOGGER_ID, OWNER_ID
+
+    @app.on_message(filters.command("profile") & filters.user([OWNER_ID, *EVAL]), group=-1)
+    async def profile_command(client, message):
+        try:
+            await _profile_command(client, message)
+        except Exception:
+            # Logged here: stop_propagation() raises and would hide it.
+            logger.exception("/profile failed")
+        message.stop_propagation()
+
+    async def _profile_command(client, message):
+        try:
+            seconds = int(message.command[1]) if len(message.command) > 1 else 30
+        except ValueError:
+            return await message.reply_text("Usage: /profile [seconds]")
+        seconds = max(1, min(seconds, PROFILE_MAX_SECONDS))
+        await message.reply_text(f"Profiling for {seconds}s...")
+        try:
+            path, samples, lag = await profile(seconds)
+        except RuntimeError as e:
+            return await message.reply_text(str(e))
+        caption = f"Profile: {seconds}s, {samples} samples\nLoop lag: {lag}"
+        await client.send_document(LOGGER_ID, path, caption=caption)
+        await message.reply_text(caption)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    return profile_command
@@ -0,0 +1,440 @@
+import argparse
+import asyncio
+import importlib
+import importlib.util
+import logging
+import multiprocessing as mp
+import os
+import queue
+import random
+import threading
+import time
+from io import BytesIO
+from os import getenv
+
+# ------------------------------------
+# Horizontal sharding of chats across worker processes.
+#
+#   python shards.py --workers 4 --bot gpt/testing.py
+#   python shards.py --workers 4 --handler mybot:handle_update
+#   python shards.py --workers 4 --fake 10000      (local test run)
+#
+# Every update is routed to a worker by its chat_id, so one chat is always
+# handled by the same process and its updates keep their order.
+#
+# With --bot, every worker imports the bot module and starts its own
+# session of the bot's client with no_updates, so Telegram only pushes
+# updates to the supervisor. Each raw update is fed to the worker client's
+# dispatcher, which runs the bot's handlers and filters as usual.
+# The bot's setup(primary) registers its owner commands and background
+# jobs; jobs that must run once (reminders, index builds) only run in
+# shard 0. With --handler, workers get {chat_id, message_id, text} dicts
+# instead.
+#
+# The state backend (SHARD_STATE) only holds the shards' own counters. The
+# bots' rate limiter, circuit breaker and caches stay per process:
+#   - the outbox's bot-wide send rate is split evenly between the shards;
+#   - per-user rate limits hold for private chats (chat == user, so one
+#     shard), but a user writing in groups on N shards gets up to N times
+#     the allowance;
+#   - each shard's breaker trips and probes on its own calls only;
+#   - caches (answers, file_ids, metadata) warm up separately per shard.
+#
+# A monitor thread restarts crashed workers, independently of traffic,
+# backing off exponentially. A shard that keeps crashing (e.g. at import)
+# is given up on after SHARD_MAX_RESTARTS tries in a row; its updates are
+# dropped until the supervisor is restarted.
+# ------------------------------------
+
+logger = logging.getLogger(__name__)
+
+SHARD_WORKERS = int(getenv("SHARD_WORKERS", mp.cpu_count()))
+SHARD_STATE = getenv("SHARD_STATE", "local")  # "local" or "mongo"
+SHARD_RESTART_DELAY = float(getenv("SHARD_RESTART_DELAY", "1"))  # doubles per crash in a row
+SHARD_RESTART_MAX_DELAY = float(getenv("SHARD_RESTART_MAX_DELAY", "60"))
+SHARD_MAX_RESTARTS = int(getenv("SHARD_MAX_RESTARTS", "5"))
+SHARD_STABLE_AFTER = float(getenv("SHARD_STABLE_AFTER", "60"))  # uptime that resets the count
+SHARD_CHECK_INTERVAL = float(getenv("SHARD_CHECK_INTERVAL", "1"))
+
+
+def shard_for(chat_id, workers):
+    # Jump consistent hash: stable for a given worker count and moves only
+    # ~1/n of the chats when a worker is added.
+    key = int(chat_id) & 0xFFFFFFFFFFFFFFFF
+    b, j = -1, 0
+    while j < workers:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return b
+
+
+# ------------------------------------
+# State backends shared by all workers
+# ------------------------------------
+class LocalState:
+    # Stand-in for Mongo when running on one machine. Backed by a
+    # multiprocessing manager so every worker sees the same dict.
+    def __init__(self, manager=None):
+        self.manager = manager or mp.Manager()
+        self.data = self.manager.dict()
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def set(self, key, value):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def incr(self, key, amount=1):
+        # Manager dicts are not atomic across processes; good enough for
+        # counters that are only used for stats.
+        value = self.data.get(key, 0) + amount
+        self.data[key] = value
+        return value
+
+
+class MongoState:
+    def __init__(self, uri=None, db="telegram_bot_db", collection="shard_state"):
+        self.uri = uri
+        self.db_name = db
+        self.collection_name = collection
+        self._collection = None
+
+    def __getstate__(self):
+        # Only the connection details travel to a worker; each process
+        # opens its own client after fork/spawn.
+        state = self.__dict__.copy()
+        state["_collection"] = None
+        return state
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            from pymongo import MongoClient
+
+            from config import MONGO_DB_URI
+
+            client = MongoClient(self.uri or MONGO_DB_URI)
+            self._collection = client[self.db_name][self.collection_name]
+        return self._collection
+
+    def get(self, key, default=None):
+        doc = self.collection.find_one({"_id": key})
+        return doc["value"] if doc else default
+
+    def set(self, key, value):
+        self.collection.update_one({"_id": key}, {"$set": {"value": value}}, upsert=True)
+
+    def delete(self, key):
+        self.collection.delete_one({"_id": key})
+
+    def incr(self, key, amount=1):
+        doc = self.collection.find_one_and_update(
+            {"_id": key},
+            {"$inc": {"value": amount}},
+            upsert=True,
+            return_document=True,
+        )
+        return doc["value"]
+
+
+def get_state(kind=None):
+    kind = kind or SHARD_STATE
+    if kind == "mongo":
+        return MongoState()
+    return LocalState()
+
+
+# ------------------------------------
+# Workers
+# ------------------------------------
+def load_handler(path):
+    module, _, name = path.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+
+def worker_main(index, inbox, state, handler_path):
+    handler = load_handler(handler_path)
+    while True:
+        update = inbox.get()
+        if update is None:
+            break
+        try:
+            handler(update, state)
+        except Exception as e:
+            logger.error(f"Shard {index} handler error: {e}")
+        state.incr(f"handled:{index}")
+
+
+def count_update(update, state):
+    # Default handler for --fake runs: counts updates per chat.
+    state.incr(f"chat:{update['chat_id']}")
+
+
+def load_bot(path):
+    # Import a bot module (e.g. gpt/testing.py) by path, under a private name
+    # so its `if __name__ == "__main__"` block doesn't run.
+    name = "shard_" + os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(name, os.path.abspath(path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def bot_client(module):
+    from pyrogram import Client
+
+    for value in vars(module).values():
+        if isinstance(value, Client):
+            return value
+    raise ValueError(f"{module.__name__} has no pyrogram Client")
+
+
+def encode_update(update, users, chats):
+    # Raw TL objects serialize to bytes, which is all that has to cross the
+    # process boundary.
+    return (update.write(), [u.write() for u in users.values()], [c.write() for c in chats.values()])
+
+
+def decode_update(packet):
+    from pyrogram.raw.core import TLObject
+
+    update, users, chats = packet
+    users = [TLObject.read(BytesIO(b)) for b in users]
+    chats = [TLObject.read(BytesIO(b)) for b in chats]
+    return TLObject.read(BytesIO(update)), {u.id: u for u in users}, {c.id: c for c in chats}
+
+
+async def serve_shard(index, app, inbox, state):
+    # The client was started with no_updates, so its dispatcher has no
+    # handler tasks; start them the way Dispatcher.start does and feed them
+    # from the supervisor instead of from Telegram.
+    loop = asyncio.get_running_loop()
+    dispatcher = app.dispatcher
+    async with app:
+        for _ in range(app.workers):
+            lock = asyncio.Lock()
+            dispatcher.locks_list.append(lock)
+            dispatcher.handler_worker_tasks.append(loop.create_task(dispatcher.handler_worker(lock)))
+        while True:
+            update = await loop.run_in_executor(None, inbox.get)
+            if update is None:
+                break
+            try:
+                dispatcher.updates_queue.put_nowait(decode_update(update["raw"]))
+            except Exception as e:
+                logger.error(f"Shard {index} bad update: {e}")
+            await loop.run_in_executor(None, state.incr, f"handled:{index}")
+        for _ in dispatcher.handler_worker_tasks:
+            dispatcher.updates_queue.put_nowait(None)
+        await asyncio.gather(*dispatcher.handler_worker_tasks)
+        dispatcher.handler_worker_tasks.clear()
+
+
+def bot_worker_main(index, inbox, state, bot_path, workers=1):
+    # Runs the bot's own handlers on the updates routed to this shard.
+    from outbox import Outbox
+
+    bot = load_bot(bot_path)
+    app = bot_client(bot)
+    for value in vars(bot).values():
+        if isinstance(value, Outbox):
+            value.rate /= workers  # Telegram's limit is per bot, not per process
+    app.no_updates = True  # Telegram's updates arrive through the supervisor
+    if not app.session_string and not app.in_memory:
+        app.name = f"{app.name}-shard{index}"  # one session file per process
+    setup = getattr(bot, "setup", None)
+    if setup is not None:
+        setup(primary=index == 0)
+    app.run(serve_shard(index, app, inbox, state))
+
+
+class Supervisor:
+    def __init__(self, workers=None, handler="shards:count_update", state=None, bot=None):
+        self.workers = workers or SHARD_WORKERS
+        self.handler = handler
+        self.bot = bot
+        self.state = state if state is not None else get_state()
+        self.queues = [mp.Queue() for _ in range(self.workers)]
+        self.procs = [None] * self.workers
+        self.restarts = [0] * self.workers
+        self.crashes = [0] * self.workers  # in a row, without a stable run between
+        self.failed = set()  # shards given up on
+        self.dropped = [0] * self.workers
+        self._started_at = [0.0] * self.workers
+        self._restart_at = {}  # shard -> when its replacement is due
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._monitor = None
+
+    def _spawn(self, index):
+        if self.bot:
+            target, args = bot_worker_main, (index, self.queues[index], self.state, self.bot, self.workers)
+        else:
+            target, args = worker_main, (index, self.queues[index], self.state, self.handler)
+        proc = mp.Process(target=target, args=args, name=f"shard-{index}", daemon=True)
+        proc.start()
+        self.procs[index] = proc
+        self._started_at[index] = time.monotonic()
+
+    def start(self):
+        for index in range(self.workers):
+            self._spawn(index)
+        self._stopped.clear()
+        self._monitor = threading.Thread(target=self._watch, name="shard-monitor", daemon=True)
+        self._monitor.start()
+
+    def dispatch(self, update):
+        index = shard_for(update["chat_id"], self.workers)
+        if index in self.failed:
+            # Nobody will read this queue again; don't let it grow.
+            self.dropped[index] += 1
+            return
+        self.queues[index].put(update)
+
+    def check(self, now=None):
+        # Restart crashed workers, waiting SHARD_RESTART_DELAY * 2**n after
+        # the n-th crash in a row. Their queue lives in the supervisor, so
+        # pending updates are picked up by the replacement process.
+        now = now or time.monotonic()
+        with self._lock:
+            for index, proc in enumerate(self.procs):
+                if proc is None or proc.is_alive() or proc.exitcode == 0 or index in self.failed:
+                    continue
+                due = self._restart_at.get(index)
+                if due is None:
+                    if now - self._started_at[index] >= SHARD_STABLE_AFTER:
+                        self.crashes[index] = 0
+                    self.crashes[index] += 1
+                    if self.crashes[index] > SHARD_MAX_RESTARTS:
+                        self.failed.add(index)
+                        logger.critical(
+                            f"Shard {index} crashed {self.crashes[index]} times in a row (exit {proc.exitcode}); "
+                            "not restarting it. Its chats get no replies until the supervisor is restarted."
+                        )
+                        continue
+                    delay = min(SHARD_RESTART_DELAY * 2 ** (self.crashes[index] - 1), SHARD_RESTART_MAX_DELAY)
+                    logger.error(
+                        f"Shard {index} died (exit {proc.exitcode}), "
+                        f"restart {self.crashes[index]}/{SHARD_MAX_RESTARTS} in {delay:.1f}s"
+                    )
+                    self._restart_at[index] = now + delay
+                elif now >= due:
+                    del self._restart_at[index]
+                    self.restarts[index] += 1
+                    self._spawn(index)
+
+    def _watch(self):
+        while not self._stopped.wait(SHARD_CHECK_INTERVAL):
+            self.check()
+
+    def run(self, source):
+        self.start()
+        for update in source:
+            self.dispatch(update)
+        self.stop()
+
+    def stop(self, timeout=30):
+        for q in self.queues:
+            q.put(None)
+        deadline = time.monotonic() + timeout
+        # The monitor keeps restarting crashed workers so their queues drain.
+        while any(
+            p.is_alive() or (p.exitcode != 0 and i not in self.failed) for i, p in enumerate(self.procs)
+        ):
+            if time.monotonic() > deadline:
+                break
+            time.sleep(0.1)
+        self._stopped.set()
+        for proc in self.procs:
+            proc.join(timeout=1)
+
+
+def fake_updates(count, chats=100, seed=0):
+    rnd = random.Random(seed)
+    for i in range(count):
+        yield {"chat_id": rnd.randint(1, chats), "message_id": i, "text": "hi"}
+
+
+def pyrogram_updates(app):
+    # Bridge a running pyrogram Client into the supervisor: every message
+    # becomes a plain dict that can cross the process boundary, carrying
+    # the serialized raw update for --bot workers.
+    inbox = queue.Queue()
+
+    @app.on_raw_update()
+    async def _collect(client, update, users, chats):
+        message = getattr(update, "message", None)
+        peer = getattr(message, "peer_id", None)
+        chat_id = getattr(peer, "user_id", None) or getattr(peer, "chat_id", None) or getattr(peer, "channel_id", None)
+        if chat_id is None:
+            return
+        inbox.put({
+            "chat_id": chat_id,
+            "message_id": message.id,
+            "text": getattr(message, "message", ""),
+            "raw": encode_update(update, users, chats),
+        })
+
+    return iter(inbox.get, None)
+
+
+def receiver(bot_path=None):
+    # The supervisor's own session. With --bot it logs in as the same
+    # account as the bot, but has none of the bot's handlers.
+    from pyrogram import Client
+
+    if bot_path:
+        app = bot_client(load_bot(bot_path))
+        return Client(
+            f"{app.name}-supervisor",
+            api_id=app.api_id,
+            api_hash=app.api_hash,
+            bot_token=app.bot_token,
+            session_string=app.session_string,
+            in_memory=app.in_memory,
+        )
+
+    from config import API_HASH, API_ID, BOT_TOKEN
+
+    return Client("shard_supervisor", api_id=API_ID, api_hash=API_HASH, bot_token=BOT_TOKEN)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run bot updates across sharded worker processes")
+    parser.add_argument("--workers", type=int, default=SHARD_WORKERS)
+    parser.add_argument("--handler", default="shards:count_update")
+    parser.add_argument("--bot", help="run this bot module's handlers in every shard, e.g. gpt/testing.py")
+    parser.add_argument("--state", default=SHARD_STATE, choices=["local", "mongo"])
+    parser.add_argument("--fake", type=int, default=0, help="feed N fake updates instead of Telegram")
+    args = parser.parse_args()
+
+    supervisor = Supervisor(args.workers, args.handler, get_state(args.state), bot=args.bot)
+    if args.fake:
+        start = time.perf_counter()
+        supervisor.run(fake_updates(args.fake))
+        took = time.perf_counter() - start
+        handled = sum(supervisor.state.get(f"handled:{i}", 0) for i in range(args.workers))
+        print(f"{handled} updates on {args.workers} workers in {took:.2f}s ({handled / took:.0f}/s)")
+        print(f"restarts: {supervisor.restarts}")
+        if supervisor.failed:
+            print(f"failed shards: {sorted(supervisor.failed)}, dropped: {supervisor.dropped}")
+        return
+
+    app = receiver(args.bot)
+    source = pyrogram_updates(app)
+
+    async def serve():
+        # Dispatching blocks, so it runs in a thread while the client keeps
+        # receiving updates on the event loop.
+        async with app:
+            await asyncio.get_running_loop().run_in_executor(None, supervisor.run, source)
+
+    app.run(serve())
+
+
+if __name__ == "__main__":
+    main()
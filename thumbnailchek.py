@@ -1,14 +1,62 @@
 import os
 import re
-
-import aiofiles
-import aiohttp
-from PIL import Image, ImageDraw, ImageEnhance, ImageFilter, ImageFont
-from unidecode import unidecode
-from youtubesearchpython.__future__ import VideosSearch
+from functools import lru_cache
 
 from AmritaXMusic import app
+from admission import REJECT, check, lookup, remember
 from config import YOUTUBE_IMG_URL
+from cookiepool import pool as cookies
+from lazy import lazy_import
+from metrics import timed
+
+# Only needed once a thumbnail actually has to be drawn
+aiofiles = lazy_import("aiofiles")
+aiohttp = lazy_import("aiohttp")
+Image = lazy_import("PIL.Image")
+ImageDraw = lazy_import("PIL.ImageDraw")
+ImageEnhance = lazy_import("PIL.ImageEnhance")
+ImageFilter = lazy_import("PIL.ImageFilter")
+ImageFont = lazy_import("PIL.ImageFont")
+_unidecode = lazy_import("unidecode")
+_search = lazy_import("youtubesearchpython.__future__")
+_search_constants = lazy_import("youtubesearchpython.core.constants")
+httpx = lazy_import("httpx")
+
+# Responses that mean YouTube didn't like the jar we sent.
+COOKIE_REJECTED = (401, 403, 429)
+
+
+def unidecode(text):
+    return _unidecode.unidecode(text)
+
+
+@lru_cache(maxsize=None)
+def _search_class():
+    # The library only sends a User-Agent; send a jar from the cookie pool
+    # with its search request too, and tell the pool how it went.
+    class CookieVideosSearch(_search.VideosSearch):
+        async def asyncPostRequest(self):
+            jar = cookies.acquire()
+            if jar is None:
+                return await super().asyncPostRequest()
+            headers = {"User-Agent": _search_constants.userAgent, "Cookie": jar.header}
+            try:
+                async with httpx.AsyncClient(proxies=self.proxy) as client:
+                    response = await client.post(self.url, headers=headers, json=self.data, timeout=self.timeout)
+            except httpx.HTTPError:
+                cookies.failure(jar)
+                raise
+            if response.status_code in COOKIE_REJECTED:
+                cookies.failure(jar)
+            else:
+                cookies.success(jar)
+            return response
+
+    return CookieVideosSearch
+
+
+def VideosSearch(query, limit=1):
+    return _search_class()(query, limit=limit)
 
 
 def changeImageSize(maxWidth, maxHeight, image):
@@ -29,93 +77,149 @@ def clear(text):
     return title.strip()
 
 
+# Progress bar geometry on the 1280x720 card
+BAR_START = 55
+BAR_END = 1220
+BAR_Y = 660
+KNOB_RADIUS = 12
+# Everything the progress bar touches: line, knob and the two time labels.
+PROGRESS_BOX = (0, BAR_Y - KNOB_RADIUS - 8, 1280, 720)
+
+
+@lru_cache(maxsize=8)
+def font(path, size):
+    return ImageFont.truetype(path, size)
+
+
+async def fetch_meta(videoid):
+    url = f"https://www.youtube.com/watch?v={videoid}"
+    results = VideosSearch(url, limit=1)
+    for result in (await results.next())["result"]:
+        try:
+            title = result["title"]
+            title = re.sub("\W+", " ", title)
+            title = title.title()
+        except:
+            title = "Unsupported Title"
+        try:
+            duration = result["duration"]
+        except:
+            duration = "Unknown Mins"
+        thumbnail = result["thumbnails"][0]["url"].split("?")[0]
+        try:
+            views = result["viewCount"]["short"]
+        except:
+            views = "Unknown Views"
+        try:
+            channel = result["channel"]["name"]
+        except:
+            channel = "Unknown Channel"
+        remember(videoid, result)
+    return {
+        "title": title,
+        "duration": duration,
+        "thumbnail": thumbnail,
+        "views": views,
+        "channel": channel,
+    }
+
+
+async def download_thumb(videoid, url):
+    path = f"cache/thumb{videoid}.png"
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url) as resp:
+            if resp.status == 200:
+                f = await aiofiles.open(path, mode="wb")
+                await f.write(await resp.read())
+                await f.close()
+    return path
+
+
+def compose_base(youtube, meta):
+    # The card without its progress bar.
+    image1 = changeImageSize(1280, 720, youtube)
+    image2 = image1.convert("RGBA")
+    background = image2.filter(filter=ImageFilter.BoxBlur(10))
+    enhancer = ImageEnhance.Brightness(background)
+    background = enhancer.enhance(0.5)
+    draw = ImageDraw.Draw(background)
+    arial = font("AmritaXMusic/assets/font2.ttf", 30)
+    title_font = font("AmritaXMusic/assets/font.ttf", 30)
+    draw.text((1110, 8), unidecode(app.name), fill="white", font=arial)
+    draw.text(
+        (55, 560),
+        f"{meta['channel']} | {meta['views'][:23]}",
+        (255, 255, 255),
+        font=arial,
+    )
+    draw.text(
+        (57, 600),
+        clear(meta["title"]),
+        (255, 255, 255),
+        font=title_font,
+    )
+    return background
+
+
+def draw_progress(background, elapsed, duration, knob_x=BAR_START, origin=(0, 0)):
+    # `origin` is where `background` sits on the card, so the same code can
+    # draw onto just the progress strip (see nowplaying.py).
+    ox, oy = origin
+    draw = ImageDraw.Draw(background)
+    arial = font("AmritaXMusic/assets/font2.ttf", 30)
+    draw.line(
+        [(BAR_START - ox, BAR_Y - oy), (BAR_END - ox, BAR_Y - oy)],
+        fill="white",
+        width=5,
+        joint="curve",
+    )
+    draw.ellipse(
+        [(knob_x - ox, BAR_Y - KNOB_RADIUS - oy), (knob_x + 2 * KNOB_RADIUS - ox, BAR_Y + KNOB_RADIUS - oy)],
+        outline="white",
+        fill="white",
+        width=15,
+    )
+    draw.text(
+        (36 - ox, 685 - oy),
+        elapsed,
+        (255, 255, 255),
+        font=arial,
+    )
+    draw.text(
+        (1185 - ox, 685 - oy),
+        f"{duration[:23]}",
+        (255, 255, 255),
+        font=arial,
+    )
+    return background
+
+
+@timed("get_thumb")
 async def get_thumb(videoid):
     if os.path.isfile(f"cache/{videoid}.png"):
         return f"cache/{videoid}.png"
 
-    url = f"https://www.youtube.com/watch?v={videoid}"
     try:
-        results = VideosSearch(url, limit=1)
-        for result in (await results.next())["result"]:
-            try:
-                title = result["title"]
-                title = re.sub("\W+", " ", title)
-                title = title.title()
-            except:
-                title = "Unsupported Title"
-            try:
-                duration = result["duration"]
-            except:
-                duration = "Unknown Mins"
-            thumbnail = result["thumbnails"][0]["url"].split("?")[0]
-            try:
-                views = result["viewCount"]["short"]
-            except:
-                views = "Unknown Views"
-            try:
-                channel = result["channel"]["name"]
-            except:
-                channel = "Unknown Channel"
-
-        async with aiohttp.ClientSession() as session:
-            async with session.get(thumbnail) as resp:
-                if resp.status == 200:
-                    f = await aiofiles.open(f"cache/thumb{videoid}.png", mode="wb")
-                    await f.write(await resp.read())
-                    await f.close()
-
-        youtube = Image.open(f"cache/thumb{videoid}.png")
-        image1 = changeImageSize(1280, 720, youtube)
-        image2 = image1.convert("RGBA")
-        background = image2.filter(filter=ImageFilter.BoxBlur(10))
-        enhancer = ImageEnhance.Brightness(background)
-        background = enhancer.enhance(0.5)
-        draw = ImageDraw.Draw(background)
-        arial = ImageFont.truetype("AmritaXMusic/assets/font2.ttf", 30)
-        font = ImageFont.truetype("AmritaXMusic/assets/font.ttf", 30)
-        draw.text((1110, 8), unidecode(app.name), fill="white", font=arial)
-        draw.text(
-            (55, 560),
-            f"{channel} | {views[:23]}",
-            (255, 255, 255),
-            font=arial,
-        )
-        draw.text(
-            (57, 600),
-            clear(title),
-            (255, 255, 255),
-            font=font,
-        )
-        draw.line(
-            [(55, 660), (1220, 660)],
-            fill="white",
-            width=5,
-            joint="curve",
-        )
-        draw.ellipse(
-            [(918, 648), (942, 672)],
-            outline="white",
-            fill="white",
-            width=15,
-        )
-        draw.text(
-            (36, 685),
-            "00:00",
-            (255, 255, 255),
-            font=arial,
-        )
-        draw.text(
-            (1185, 685),
-            f"{duration[:23]}",
-            (255, 255, 255),
-            font=arial,
-        )
+        # Don't search, fetch or draw anything for a track that can't be
+        # played. A cached verdict skips the search too; otherwise the
+        # search result is what fills the cache.
+        cached = lookup(videoid) is not None
+        if cached and check(videoid)[0] == REJECT:
+            return YOUTUBE_IMG_URL
+        meta = await fetch_meta(videoid)
+        if not cached and check(videoid)[0] == REJECT:
+            return YOUTUBE_IMG_URL
+
+        path = await download_thumb(videoid, meta["thumbnail"])
+        youtube = Image.open(path)
+        background = compose_base(youtube, meta)
+        draw_progress(background, "00:00", meta["duration"], knob_x=918)
         try:
-            os.remove(f"cache/thumb{videoid}.png")
+            os.remove(path)
         except:
             pass
         background.save(f"cache/{videoid}.png")
         return f"cache/{videoid}.png"
     except Exception as e:
         print(e)
-        return YOUTUBE_IMG_URL
\ No newline at end of file
+        return YOUTUBE_IMG_URL
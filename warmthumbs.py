@@ -0,0 +1,135 @@
+import argparse
+import asyncio
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+
+# ------------------------------------
+# Pre-render thumbnails into cache/ so the first play after a deploy or a
+# cache wipe doesn't pay for get_thumb.
+#
+#   python warmthumbs.py --file ids.txt --workers 8
+#   python warmthumbs.py --mongo playhistory --field videoid --limit 5000
+# ------------------------------------
+
+_url = re.compile(r"(?:v=|youtu\.be/|shorts/)([A-Za-z0-9_-]{11})")
+_bare = re.compile(r"[A-Za-z0-9_-]{11}")
+_loop = None
+
+
+def parse_ids(lines):
+    seen = set()
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        match = _url.search(line)
+        videoid = match.group(1) if match else line if _bare.fullmatch(line) else None
+        if videoid and videoid not in seen:
+            seen.add(videoid)
+            yield videoid
+
+
+def ids_from_mongo(collection, field, limit):
+    # Most played first, so a partial run still covers the popular tracks.
+    from pymongo import MongoClient
+
+    from config import MONGO_DB_URI
+
+    db = MongoClient(MONGO_DB_URI)["telegram_bot_db"]
+    pipeline = [
+        {"$group": {"_id": f"${field}", "plays": {"$sum": 1}}},
+        {"$sort": {"plays": -1}},
+    ]
+    if limit:
+        pipeline.append({"$limit": limit})
+    return [doc["_id"] for doc in db[collection].aggregate(pipeline) if doc["_id"]]
+
+
+def cached(videoid):
+    return os.path.isfile(f"cache/{videoid}.png")
+
+
+def _init_worker(initializer=None):
+    global _loop
+    _loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_loop)
+    if initializer:
+        initializer()
+
+
+def render(videoid):
+    from thumbnailchek import get_thumb
+
+    start = time.perf_counter()
+    path = _loop.run_until_complete(get_thumb(videoid))
+    return videoid, path == f"cache/{videoid}.png", time.perf_counter() - start
+
+
+def warm(videoids, workers=None, initializer=None, out=sys.stdout):
+    # initializer (optional) runs in each worker before the first render.
+    todo = [v for v in videoids if not cached(v)]
+    skipped = len(videoids) - len(todo)
+    os.makedirs("cache", exist_ok=True)
+    print(f"{len(videoids)} videoids, {skipped} already cached, rendering {len(todo)}", file=out)
+    done = failed = 0
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=partial(_init_worker, initializer)) as pool:
+        futures = [pool.submit(render, v) for v in todo]
+        for future in as_completed(futures):
+            try:
+                videoid, ok, took = future.result()
+            except Exception as e:
+                videoid, ok, took = "?", False, 0
+                print(f"  worker error: {e}", file=out)
+            done += 1
+            failed += not ok
+            rate = done / (time.perf_counter() - start)
+            status = "ok" if ok else "FAILED"
+            print(f"[{done}/{len(todo)}] {videoid} {status} {took:.2f}s  ({rate:.1f}/s)", file=out)
+
+    took = time.perf_counter() - start
+    rendered = done - failed
+    summary = {
+        "total": len(videoids),
+        "skipped": skipped,
+        "rendered": rendered,
+        "failed": failed,
+        "seconds": took,
+        "per_second": rendered / took if took else 0.0,
+    }
+    print(
+        f"\nrendered {rendered}, failed {failed}, skipped {skipped} in {took:.1f}s "
+        f"-> {summary['per_second']:.2f} thumbnails/sec",
+        file=out,
+    )
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-render thumbnails into cache/")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--file", help="file with one videoid or YouTube URL per line ('-' for stdin)")
+    source.add_argument("--mongo", metavar="COLLECTION", help="play history collection to read videoids from")
+    parser.add_argument("--field", default="videoid", help="videoid field in the play history")
+    parser.add_argument("--limit", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    if args.file:
+        handle = sys.stdin if args.file == "-" else open(args.file)
+        videoids = list(parse_ids(handle))
+        if args.limit:
+            videoids = videoids[: args.limit]
+    else:
+        videoids = ids_from_mongo(args.mongo, args.field, args.limit)
+    summary = warm(videoids, args.workers)
+    sys.exit(1 if summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()